@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+CONFA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+THRESHOLD = 0.2  # Во сколько раз (в долях) фаза может стать медленнее базовой без сообщения о регрессии
+MIN_DELTA = 0.002  # Разница меньше этой (в секундах) не считается регрессией: это шум замера
+
+# Команды оболочки ZIP: каждая повторяется, чтобы её время было заметно больше шума
+ZIPSHELL_SCRIPT = ["ls", "cd /d0/s0", "ls", "du -s /", "du -a /d0", "cat f0.txt", "head -n 5 f0.txt",
+                   "find *.txt", "grep file /d0/s1"] * 20
+
+# Синтетические данные создаются генераторами из bench.py каждого задания:
+# вид -> (каталог, код, файл данных, размер). В коде доступны path - путь к данным и size - размер
+DATA = {
+    "zipshell": ("dz", "from bench import make_archive; make_archive(path, size)", "archive.zip", 50_000),
+    "grapher": ("dz_2.0", "from bench import make_repo; make_repo(path, size)", "repo", 5_000),
+    "translator": ("dz_3.0", "from bench import make_config\n"
+                             "with open(path, 'w', encoding='utf-8') as file:\n"
+                             "    file.write(make_config(size))", "config.txt", 200_000),
+}
+
+# Случаи: имя -> (вид данных, каталог, аргументы инструмента, файл для stdin или None).
+# {data} и {workdir} подставляются при запуске. Инструменты запускаются отдельными процессами:
+# у заданий одинаковые имена модулей (main, bench), а замер идёт через их собственный --profile
+CASES = {
+    "zipshell": ("zipshell", "dz", ["zipshell.py", "{data}", "{workdir}/script.txt", "--grep-workers", "1"], None),
+    "grapher-git-svg": ("grapher", "dz_2.0",
+                        ["main.py", "--repo-path", "{data}", "--output-path", "{workdir}/graph.svg",
+                         "--before-date", "2100-01-01", "--renderer", "svg"], None),
+    "grapher-native-dot": ("grapher", "dz_2.0",
+                           ["main.py", "--repo-path", "{data}", "--output-path", "{workdir}/graph.dot",
+                            "--before-date", "2100-01-01", "--renderer", "dot", "--reader", "native",
+                            "--collapse-chains"], None),
+    "translator": ("translator", "dz_3.0", ["main.py"], "{data}"),
+}
+
+def make_data(kind, scale, workdir):
+    tool_dir, code, file_name, size = DATA[kind]
+    path = os.path.join(workdir, file_name)
+    subprocess.run([sys.executable, "-c", f"path = {path!r}; size = {int(size * scale)}\n{code}"],
+                   cwd=os.path.join(CONFA_DIR, tool_dir), check=True, stdout=subprocess.DEVNULL)
+    return path
+
+def run_case(name, data_path, workdir):
+    # Один запуск инструмента с --profile json; результат - время фаз и общее время
+    _, tool_dir, argv, stdin_path = CASES[name]
+    report_path = os.path.join(workdir, "profile.json")
+    argv = [arg.format(data=data_path, workdir=workdir) for arg in argv]
+    stdin = open(stdin_path.format(data=data_path), encoding="utf-8") if stdin_path else subprocess.DEVNULL
+    try:
+        subprocess.run([sys.executable, *argv, "--profile", "json", "--profile-output", report_path],
+                       cwd=os.path.join(CONFA_DIR, tool_dir), stdin=stdin, stdout=subprocess.DEVNULL, check=True)
+    finally:
+        if stdin_path:
+            stdin.close()
+    with open(report_path, encoding="utf-8") as file:
+        report = json.load(file)
+    timings = {phase: value["seconds"] for phase, value in report["phases"].items()}
+    timings["total"] = report["total_seconds"]
+    return timings
+
+def run_cases(names, scale, repeat, workdir):
+    # Лучшее время каждой фазы из repeat запусков: минимум меньше всего зависит от фоновой нагрузки
+    with open(os.path.join(workdir, "script.txt"), "w", encoding="utf-8") as file:
+        file.write("\n".join(ZIPSHELL_SCRIPT) + "\n")
+    data_paths = {}
+    results = {}
+    for name in names:
+        kind = CASES[name][0]
+        if kind not in data_paths:
+            data_paths[kind] = make_data(kind, scale, workdir)
+        best = {}
+        for _ in range(repeat):
+            for phase, seconds in run_case(name, data_paths[kind], workdir).items():
+                best[phase] = min(seconds, best.get(phase, seconds))
+        results[name] = best
+        print(f"{name}: {best['total']:.3f} s", file=sys.stderr)
+    return results
+
+def compare(results, baseline, threshold):
+    # Строки отчёта и число регрессий: фаза медленнее базовой больше чем на threshold и на MIN_DELTA
+    lines = [f"{'case':<20} {'phase':<16} {'baseline':>10} {'current':>10} {'change':>8}"]
+    regressions = 0
+    for name, timings in results.items():
+        for phase, seconds in timings.items():
+            old = baseline.get(name, {}).get(phase)
+            if old is None:
+                lines.append(f"{name:<20} {phase:<16} {'-':>10} {seconds:>10.4f} {'new':>8}")
+                continue
+            change = (seconds - old) / old if old else 0.0
+            mark = ""
+            if seconds > old * (1 + threshold) and seconds - old > MIN_DELTA:
+                regressions += 1
+                mark = "  REGRESSION"
+            lines.append(f"{name:<20} {phase:<16} {old:>10.4f} {seconds:>10.4f} {change:>+8.0%}{mark}")
+    return lines, regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the hot paths of the confa tools on synthetic data "
+                                                 "and compare per-phase timings with a saved baseline.")
+    parser.add_argument("cases", nargs="*", help=f"Cases to run (default: all of {', '.join(CASES)}).")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the synthetic data sizes.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the best time of each phase is kept.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline timings file (default: %(default)s).")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Allowed slowdown as a fraction of the baseline (default: %(default)s).")
+    parser.add_argument("--save", action="store_true", help="Store the timings of this run as the new baseline.")
+    args = parser.parse_args()
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+    return args
+
+def main():
+    args = parse_args()
+    names = args.cases or list(CASES)
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_cases(names, args.scale, max(1, args.repeat), workdir)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    lines, regressions = compare(results, baseline, args.threshold)
+    print("\n".join(lines))
+    if args.save or not baseline:
+        # Без базового файла первый запуск становится базой; остальные случаи в нём сохраняются
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2)
+            file.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"{regressions} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
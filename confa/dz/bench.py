@@ -0,0 +1,164 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from zipfile import ZipFile
+
+from zipshell import ZipShell, close_archive, open_archive
+
+# Команды замера: имя -> функция, возвращающая команду для i-го повтора
+COMMANDS = {
+    "ls": lambda i: "ls",
+    "cd": lambda i: "cd /d0/s0" if i % 2 else "cd /",
+    "du": lambda i: "du",
+    "cat": lambda i: "cat /d0/s0/f0.txt",
+    "touch": lambda i: f"touch /bench/t{i}.txt",
+}
+
+def make_archive(path, entries, big_mb=0):
+    # Синтетический архив: по 100 файлов в каталоге d<N>/s<M>/
+    # и, если задан big_mb, один большой несжатый big.log
+    with ZipFile(path, 'w') as myzip:
+        for i in range(entries):
+            myzip.writestr(f"d{i // 1000}/s{i // 100 % 10}/f{i}.txt", f"file {i}\n")
+        if big_mb:
+            with myzip.open("big.log", 'w') as big:
+                line = b"0123456789 log line\n" * 52428  # ~1 МБ
+                for _ in range(big_mb):
+                    big.write(line)
+
+def measure(shell, make_command, seconds):
+    # Команд в секунду: повторяем команду, пока не истечёт seconds (минимум один раз)
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while count == 0 or elapsed < seconds:
+        shell.execute(make_command(count))
+        count += 1
+        elapsed = time.perf_counter() - start
+    return count / elapsed
+
+def run_benchmark(entries, seconds, workdir):
+    path = os.path.join(workdir, f"bench_{entries}.zip")
+    make_archive(path, entries)
+    start = time.perf_counter()
+    with ZipFile(path, 'a') as myzip:
+        shell = ZipShell(myzip)
+        open_time = time.perf_counter() - start
+        rates = {}
+        for name, make_command in COMMANDS.items():
+            shell.execute("cd /d0/s0")
+            rates[name] = measure(shell, make_command, seconds)
+    os.remove(path)
+    return open_time, rates
+
+def peak_rss_kb():
+    # VmHWM из /proc сбрасывается при exec, а ru_maxrss на Linux наследуется от родителя
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def open_child(path, readonly):
+    # Выполняется в отдельном процессе: время открытия, время cat большого файла
+    # без ограничения размера и пиковый RSS процесса
+    import zipshell
+    zipshell.CAT_MAX_BYTES = float('inf')
+    start = time.perf_counter()
+    shell = ZipShell(open_archive(path, readonly))
+    open_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in shell.run("cat big.log")[1]:
+        pass
+    cat_time = time.perf_counter() - start
+    close_archive(shell.myzip)
+    print(open_time, cat_time, peak_rss_kb())
+
+def compare_open(entries, big_mb, workdir):
+    # Обычное открытие ('a') против отображения в память (--readonly)
+    path = os.path.join(workdir, f"open_{entries}.zip")
+    make_archive(path, entries, big_mb)
+    results = {}
+    for readonly in (False, True):
+        command = [sys.executable, __file__, "--open-child", path] + (["--readonly"] if readonly else [])
+        open_time, cat_time, rss = subprocess.run(command, capture_output=True, text=True,
+                                                  check=True).stdout.split()
+        results["mmap" if readonly else "buffered"] = (float(open_time), float(cat_time), int(rss) / 1024)
+    os.remove(path)
+    return results
+
+def measure_paint(entries, workdir):
+    # Время от Enter до первой отрисовки вывода ls для каталога из entries файлов:
+    # окно эмулятора против вставки того же текста целиком в обычный tk.Text
+    import tkinter as tk
+    from dz1 import EmulatorGUI
+    path = os.path.join(workdir, f"flat_{entries}.zip")
+    with ZipFile(path, 'w') as myzip:
+        for i in range(entries):
+            myzip.writestr(f"flat/f{i}.txt", "")
+    root = tk.Tk()
+    app = EmulatorGUI(root, path, readonly=True)
+    app.shell.run("cd flat")
+    root.update()
+    start = time.perf_counter()
+    app.entry.insert(0, "ls")
+    app.process_command(None)
+    root.update()
+    virtual_time = time.perf_counter() - start
+
+    text = tk.Text(root, wrap='word', height=10, width=50)
+    text.pack()
+    root.update()
+    start = time.perf_counter()
+    text.insert(tk.END, "\n".join(app.shell.index.list_dir("flat/")) + "\n")
+    root.update()
+    text_time = time.perf_counter() - start
+    app.shell.close()
+    root.destroy()
+    os.remove(path)
+    return virtual_time, text_time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure ZIP shell commands per second on synthetic archives.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Numbers of archive entries to test.")
+    parser.add_argument("--seconds", type=float, default=0.5, help="Time spent on each command.")
+    parser.add_argument("--big-mb", type=int, default=64,
+                        help="Size of the stored member used to compare buffered and mmap opening.")
+    parser.add_argument("--gui", action="store_true",
+                        help="Also measure Enter-to-first-paint of ls in the window (needs a display).")
+    parser.add_argument("--open-child", help=argparse.SUPPRESS)
+    parser.add_argument("--readonly", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.open_child:
+        open_child(args.open_child, args.readonly)
+        return
+    print(f"{'entries':>10} {'open, s':>8} " + " ".join(f"{name + '/s':>10}" for name in COMMANDS))
+    with tempfile.TemporaryDirectory() as workdir:
+        for entries in args.sizes:
+            open_time, rates = run_benchmark(entries, args.seconds, workdir)
+            print(f"{entries:>10} {open_time:>8.3f} " + " ".join(f"{rates[name]:>10.0f}" for name in COMMANDS))
+        print()
+        print(f"{'entries':>10} {'mode':>9} {'open, s':>8} {'cat big, s':>10} {'peak RSS, MB':>13}")
+        for entries in args.sizes:
+            for mode, (open_time, cat_time, rss) in compare_open(entries, args.big_mb, workdir).items():
+                print(f"{entries:>10} {mode:>9} {open_time:>8.3f} {cat_time:>10.3f} {rss:>13.1f}")
+        if args.gui:
+            print()
+            print(f"{'ls entries':>10} {'VirtualList, s':>15} {'tk.Text, s':>11}")
+            for entries in args.sizes:
+                virtual_time, text_time = measure_paint(entries, workdir)
+                print(f"{entries:>10} {virtual_time:>15.3f} {text_time:>11.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,100 +1,258 @@
+import argparse
+import queue
+import threading
 import tkinter as tk
-from zipfile import ZipFile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def get_dir_size(myzip, dir_path):
-    total_size = 0
-    for name in myzip.namelist():
-        if name.startswith(dir_path):
-            info = myzip.getinfo(name)
-            total_size += info.file_size
-    return total_size
+from zipshell import (PAGE_BREAK, ZipShell, add_profile_arguments, add_shell_arguments, metrics, open_archive,
+                      profiling, shell_options)
+
+POLL_MS = 20  # Период опроса очереди результатов фонового потока
+SYNC_CHECK_MS = 1000  # Период проверки, не пора ли записать накопленные touch
+HISTORY_SIZE = 1000  # Сколько команд хранится для навигации стрелками и в области истории
+
+class VirtualList(tk.Frame):
+    # Список строк, из которого в tk.Text выводятся только видимые строки.
+    # Вставка и прокрутка не зависят от общего числа строк
+    def __init__(self, master, height, width, max_lines=None):
+        super().__init__(master)
+        self.height = height
+        self.max_lines = max_lines  # Старые строки сверх лимита отбрасываются
+        self.lines = [""]  # Последняя строка может быть ещё не закончена
+        self.first = 0  # Номер первой видимой строки
+        self.render_job = None
+        self.text = tk.Text(self, wrap='none', height=height, width=width)
+        self.scrollbar = tk.Scrollbar(self, command=self.on_scrollbar)
+        self.text.pack(side=tk.LEFT)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text.config(state=tk.DISABLED)
+        self.text.bind('<MouseWheel>', lambda event: self.scroll(-3 if event.delta > 0 else 3))
+        self.text.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.text.bind('<Button-5>', lambda event: self.scroll(3))
+
+    def append(self, text):
+        if not text:
+            return
+        new_lines = text.split("\n")
+        self.lines[-1] += new_lines[0]
+        self.lines.extend(new_lines[1:])
+        if self.max_lines is not None and len(self.lines) > self.max_lines:
+            excess = len(self.lines) - self.max_lines
+            del self.lines[:excess]
+            self.first = max(0, self.first - excess)
+        self.schedule_render()
+
+    def clear(self):
+        self.lines = [""]
+        self.first = 0
+        self.schedule_render()
+
+    def get(self, *args):
+        # Весь текст, как tk.Text.get(1.0, tk.END)
+        return "\n".join(self.lines) + "\n"
+
+    def scroll(self, rows):
+        self.first = max(0, min(self.first + rows, len(self.lines) - self.height))
+        self.schedule_render()
+        return "break"
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.first = int(float(amount) * len(self.lines))
+            self.scroll(0)
+        elif unit == 'pages':
+            self.scroll(int(amount) * self.height)
+        else:
+            self.scroll(int(amount))
+
+    def schedule_render(self):
+        # Несколько вставок подряд перерисовываются один раз
+        if self.render_job is None:
+            self.render_job = self.after_idle(self.render)
+
+    def render(self):
+        self.render_job = None
+        visible = self.lines[self.first:self.first + self.height]
+        self.text.config(state=tk.NORMAL)
+        self.text.delete(1.0, tk.END)
+        self.text.insert(tk.END, "\n".join(visible))
+        self.text.config(state=tk.DISABLED)
+        total = max(len(self.lines), 1)
+        self.scrollbar.set(self.first / total, min(1.0, (self.first + self.height) / total))
 
 class EmulatorGUI:
-    def __init__(self, master):
+    def __init__(self, master, archive="rar.zip", readonly=False, **options):
         self.master = master
         master.title("ZIP Emulator")
-        self.current_dir = ""
 
-        self.history_area = tk.Text(master, wrap='word', height=20, width=50)
+        tk.Label(master, text="История команд:", anchor='w', width=50).pack()  # Заголовок для области истории
+        self.history_area = VirtualList(master, height=20, width=50, max_lines=HISTORY_SIZE)
         self.history_area.pack(pady=10)
-        self.history_area.config(state=tk.NORMAL)  # Разрешаем редактирование для вывода команды
-        self.history_area.insert(tk.END, "История команд:\n")  # Заголовок для области истории
-        self.history_area.config(state=tk.DISABLED)
 
         self.entry = tk.Entry(master, width=50)
         self.entry.pack(pady=10)
         self.entry.bind('<Return>', self.process_command)
         self.entry.bind('<Up>', self.previous_command)
         self.entry.bind('<Down>', self.next_command)
+        self.entry.bind('<Control-c>', self.cancel_command)
 
-        self.output = tk.Text(master, wrap='word', height=10, width=50)
+        self.status = tk.Label(master, text="", anchor='w', width=50)  # Индикатор занятости
+        self.status.pack()
+
+        self.output = VirtualList(master, height=10, width=50)
         self.output.pack(pady=10)
-        self.output.config(state=tk.DISABLED)
 
-        self.myzip = ZipFile("rar.zip", 'a')
-        self.command_history = []  # Список для хранения истории команд
+        self.shell = ZipShell(open_archive(archive, readonly), **options)  # options - настройки ZipShell
+        self.command_history = deque(maxlen=HISTORY_SIZE)  # Последние команды
         self.history_index = -1  # Индекс для навигации по истории
 
+        # Чтение и запись архива выполняются в одном фоновом потоке,
+        # результаты возвращаются через очередь, которую опрашивает master.after
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.results = queue.Queue()
+        self.job_id = 0  # Номер текущей фоновой команды, устаревшие результаты отбрасываются
+        self.cancel_event = threading.Event()
+        self.busy = False
+        self.stream = None  # Генератор вывода less, остановленный на конце страницы
+        self.master.after(SYNC_CHECK_MS, self.autosync)
+
+    # Состояние интерпретатора доступно и через окно
+    @property
+    def myzip(self):
+        return self.shell.myzip
+
+    @myzip.setter
+    def myzip(self, zip_file):
+        self.shell.myzip = zip_file
+
+    @property
+    def index(self):
+        return self.shell.index
+
+    @property
+    def current_dir(self):
+        return self.shell.current_dir
+
     def process_command(self, event):
         command = self.entry.get().strip()
+        if self.stream is not None and not self.busy and command in ("", "q"):
+            # less ждёт на конце страницы: Enter - следующая страница, q - выход
+            self.entry.delete(0, tk.END)
+            self.output.clear()
+            if command == "q":
+                self.stop_stream()
+            else:
+                self.submit(self.stream, "less")
+            return
+        self.stop_stream()
         if command:  # Проверяем, что команда не пустая
             self.command_history.append(command)  # Сохраняем команду в истории
             self.history_index = len(self.command_history)  # Обновляем индекс истории
 
-            # Отображаем команду в области истории
-            self.history_area.config(state=tk.NORMAL)  # Разрешаем редактирование
-            self.history_area.insert(tk.END, f"> {command}\n")  # Формат команды в консоли
-            self.history_area.config(state=tk.DISABLED)
+            self.history_area.append(f"> {command}\n")  # Формат команды в консоли
 
         self.entry.delete(0, tk.END)
-        self.output.config(state=tk.NORMAL)
-        self.output.delete(1.0, tk.END)
-
-        if command == 'ls':
-            items = set()
-            for name in self.myzip.namelist():
-                if name.startswith(self.current_dir):
-                    relative_name = name[len(self.current_dir):].split('/')[0]
-                    items.add(relative_name)
-            self.output.insert(tk.END, "\n".join(sorted(items)) + "\n")
-        elif command == "exit":
+        self.output.clear()
+
+        # ls, cd и du работают только с индексом, их вывод готов сразу,
+        # команды, читающие или пишущие архив, уходят в фоновый поток
+        with metrics.phase("command." + (command.split()[0] if command else "empty")):
+            text, stream = self.shell.run(command)
+        self.output.append(text)
+        if stream is not None:
+            self.submit(stream, command)
+        if not self.shell.running:
+            self.executor.shutdown(wait=True)
+            self.shell.close()
             self.master.quit()
-        elif command.startswith('cat '):
-            file_path = command.split()[1]
-            full_path = self.current_dir + file_path if not file_path.startswith('/') else file_path
+
+    def submit(self, stream, title):
+        # Запуск генератора вывода в фоновом потоке
+        self.job_id += 1
+        self.cancel_event = threading.Event()
+        self.stream = stream
+        self.set_busy(f"Выполняется: {title} (Ctrl+C - отмена)")
+        self.executor.submit(self.run_stream, self.job_id, stream, self.cancel_event, title.split()[0])
+        self.master.after(POLL_MS, self.poll_results)
+
+    def run_stream(self, job_id, stream, cancel_event, name="stream"):
+        # Выполняется в фоновом потоке. Генератор отдаёт куски текста и PAGE_BREAK (пауза less).
+        # Время работы с архивом прибавляется к фазе команды вместе с её частью в run()
+        with metrics.phase("command." + name):
+            self.forward_stream(job_id, stream, cancel_event)
+
+    def forward_stream(self, job_id, stream, cancel_event):
+        try:
+            for item in stream:
+                if cancel_event.is_set():
+                    stream.close()
+                    self.results.put((job_id, "^C\n"))
+                    break
+                if item is PAGE_BREAK:
+                    self.results.put((job_id, "-- Enter: следующая страница, q: выход --\n"))
+                    self.results.put((job_id, PAGE_BREAK))
+                    return
+                self.results.put((job_id, item))
+        except Exception as e:
+            self.results.put((job_id, f"Ошибка: {e}\n"))
+        self.results.put((job_id, None))  # Команда завершена
+
+    def poll_results(self):
+        texts = []
+        finished = False
+        while not finished:
             try:
-                content = self.myzip.read(full_path).decode()
-                self.output.insert(tk.END, content + "\n")
-            except KeyError:
-                self.output.insert(tk.END, f"cat: {file_path}: Нет такого файла\n")
-        elif command.startswith('cd '):
-            target_dir = command.split()[1]
-            if target_dir == "/":
-                self.current_dir = ""
-            else:
-                if target_dir.startswith("/"):
-                    new_dir = target_dir.strip("/") + "/"
-                else:
-                    new_dir = (self.current_dir + target_dir).strip("/") + "/"
-                if any(name.startswith(new_dir) for name in self.myzip.namelist()):
-                    self.current_dir = new_dir
-                else:
-                    self.output.insert(tk.END, f"cd: {target_dir}: Нет такого файла или каталога\n")
-        elif command == "du":
-            size = get_dir_size(self.myzip, self.current_dir)
-            self.output.insert(tk.END, f"Размер текущей директории: {size} байт\n")
-        elif command.startswith('touch '):
-            file_name = command.split()[1]
-            full_path = self.current_dir + file_name if not file_name.startswith('/') else file_name
-            if full_path not in self.myzip.namelist():
-                self.myzip.writestr(full_path, "")
-                self.output.insert(tk.END, f"Файл {file_name} создан.\n")
-            else:
-                self.output.insert(tk.END, f"touch: {file_name}: Файл уже существует\n")
-        else:
-            self.output.insert(tk.END, f"Неизвестная команда: {command}\n")
+                job_id, item = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if job_id != self.job_id:
+                continue  # Результат отменённой команды
+            if item is None or item is PAGE_BREAK:
+                finished = True
+                if item is None:
+                    self.stream = None
+            elif item:
+                texts.append(item)
+        if texts:
+            self.output.append("".join(texts))
+        if finished:
+            self.set_busy(None)
+        elif self.busy:
+            self.master.after(POLL_MS, self.poll_results)
+
+    def autosync(self):
+        # Накопленные touch записываются по таймеру в фоновом потоке, без вывода
+        if self.shell.sync_due():
+            self.executor.submit(self.run_sync)
+        self.master.after(SYNC_CHECK_MS, self.autosync)
+
+    def run_sync(self):
+        with metrics.phase("sync"):
+            for _ in self.shell.commit():
+                pass
+
+    def set_busy(self, text):
+        self.busy = text is not None
+        self.status.config(text=text or "")
+
+    def cancel_command(self, event):
+        # Ctrl+C в строке ввода прерывает фоновую команду
+        if self.busy or self.stream is not None:
+            self.stop_stream()
+            self.output.append("^C\n")
+            return "break"
 
-        self.output.config(state=tk.DISABLED)
+    def stop_stream(self):
+        if self.busy:
+            self.cancel_event.set()  # Генератор закроет сам фоновый поток
+            self.job_id += 1
+            self.set_busy(None)
+        elif self.stream is not None:
+            # Генератор, остановленный на странице less, закрываем в фоновом потоке,
+            # чтобы не читать архив одновременно с ним
+            self.executor.submit(self.stream.close)
+        self.stream = None
 
     def previous_command(self, event):
         if self.history_index > 0:
@@ -112,6 +270,12 @@ class EmulatorGUI:
             self.entry.delete(0, tk.END)  # Очищаем поле ввода
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = EmulatorGUI(root)
-    root.mainloop()
+    parser = argparse.ArgumentParser(description="ZIP archive shell emulator.")
+    parser.add_argument("--archive", default="rar.zip", help="Path to the ZIP archive.")
+    add_shell_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with profiling("zipshell-gui", args.profile, args.profile_output):
+        root = tk.Tk()
+        app = EmulatorGUI(root, args.archive, args.readonly, **shell_options(args))
+        root.mainloop()
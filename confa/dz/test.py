@@ -1,8 +1,15 @@
+import json
+import os
+import sys
+import tempfile
+import threading
 import unittest
 import tkinter as tk
-from zipfile import ZipFile
-from io import BytesIO
-from main import EmulatorGUI  # Замените your_script_name на имя вашего файла
+from zipfile import ZipFile, ZIP_DEFLATED
+from io import BytesIO, StringIO
+from zipshell import (ZipShell, DirIndex, get_dir_size, iter_text, head_stream, tail_stream, run_script,
+                      open_archive, open_member, close_archive, MemberCache, profiling)
+from dz1 import EmulatorGUI, HISTORY_SIZE
 
 
 class TestEmulatorGUI(unittest.TestCase):
@@ -13,6 +20,8 @@ class TestEmulatorGUI(unittest.TestCase):
             zipf.writestr("dir1/file1.txt", "Content of file1")
             zipf.writestr("dir1/file2.txt", "Content of file2")
             zipf.writestr("dir2/file3.txt", "Content of file3")
+            zipf.writestr("dir2/lines.txt", "".join(f"line{i}\n" for i in range(20)))
+            zipf.writestr("dir2/big.txt", "x" * 10 ** 6)
 
         self.test_zip.seek(0)
 
@@ -22,9 +31,15 @@ class TestEmulatorGUI(unittest.TestCase):
         self.app.myzip = ZipFile(self.test_zip, 'a')  # Используем тестовый ZIP
 
     def tearDown(self):
+        self.app.executor.shutdown(wait=True)
         self.app.myzip.close()
         self.root.destroy()
 
+    def wait_busy(self):
+        # cat/head/tail/touch выполняются в фоновом потоке, ждём окончания
+        while self.app.busy:
+            self.root.update()
+
     def test_ls(self):
         self.app.entry.insert(0, "ls")
         self.app.process_command(None)
@@ -46,15 +61,63 @@ class TestEmulatorGUI(unittest.TestCase):
     def test_cat(self):
         self.app.entry.insert(0, "cat dir1/file1.txt")
         self.app.process_command(None)
+        self.wait_busy()
         output = self.app.output.get(1.0, tk.END).strip()
         self.assertIn("Content of file1", output)
 
+    def test_head_tail(self):
+        self.app.entry.insert(0, "head -n 2 dir2/lines.txt")
+        self.app.process_command(None)
+        self.wait_busy()
+        self.assertEqual(self.app.output.get(1.0, tk.END).strip(), "line0\nline1")
+
+        self.app.entry.insert(0, "tail -n 2 dir2/lines.txt")
+        self.app.process_command(None)
+        self.wait_busy()
+        self.assertEqual(self.app.output.get(1.0, tk.END).strip(), "line18\nline19")
+
+    def test_cancel(self):
+        self.app.entry.insert(0, "cat dir2/big.txt")
+        self.app.process_command(None)
+        self.assertTrue(self.app.busy)
+        self.app.cancel_command(None)
+        self.assertFalse(self.app.busy)
+        self.assertTrue(self.app.output.get(1.0, tk.END).strip().endswith("^C"))
+
+        # После отмены ls и cd работают как обычно
+        self.app.entry.insert(0, "cd dir1")
+        self.app.process_command(None)
+        self.assertEqual(self.app.current_dir, "dir1/")
+
+    def test_virtual_output(self):
+        # В виджете только видимые строки, весь текст - в списке строк
+        self.app.output.append("".join(f"row{i}\n" for i in range(1000)))
+        self.root.update()
+        self.assertEqual(self.app.output.text.get(1.0, tk.END).split(), [f"row{i}" for i in range(10)])
+        self.app.output.scroll(500)
+        self.root.update()
+        self.assertEqual(self.app.output.text.get(1.0, tk.END).split()[0], "row500")
+        self.assertEqual(len(self.app.output.get().splitlines()), 1000)
+
+    def test_history_limit(self):
+        for i in range(HISTORY_SIZE + 5):
+            self.app.entry.insert(0, f"cd dir{i % 2 + 1}")
+            self.app.process_command(None)
+        self.assertEqual(len(self.app.command_history), HISTORY_SIZE)
+        self.assertLessEqual(len(self.app.history_area.lines), HISTORY_SIZE)
+        self.assertEqual(self.app.command_history[-1], "cd dir1")
+
     def test_touch(self):
         self.app.entry.insert(0, "touch new_file.txt")
         self.app.process_command(None)
         output = self.app.output.get(1.0, tk.END).strip()
         self.assertIn("Файл new_file.txt создан", output)
 
+        # Новые файлы записываются в архив пакетом по команде sync
+        self.app.entry.insert(0, "sync")
+        self.app.process_command(None)
+        self.wait_busy()
+
         # Проверяем, что файл появился в ZIP
         self.assertIn("new_file.txt", self.app.myzip.namelist())
 
@@ -74,5 +137,258 @@ class TestEmulatorGUI(unittest.TestCase):
         self.assertIn("Неизвестная команда", output)
 
 
+class TestZipShell(unittest.TestCase):
+    def setUp(self):
+        self.test_zip = BytesIO()
+        with ZipFile(self.test_zip, 'w') as zipf:
+            zipf.writestr("dir1/file1.txt", "Content of file1")
+            zipf.writestr("dir2/file3.txt", "Content of file3")
+        self.shell = ZipShell(ZipFile(self.test_zip, 'a'))
+
+    def test_commands(self):
+        self.assertEqual(self.shell.execute("ls"), "dir1\ndir2\n")
+        self.assertEqual(self.shell.execute("cd dir1"), "")
+        self.assertEqual(self.shell.current_dir, "dir1/")
+        self.assertEqual(self.shell.execute("cat file1.txt"), "Content of file1\n")
+        self.assertEqual(self.shell.execute("du"), "Размер текущей директории: 16 байт\n")
+        self.assertEqual(self.shell.execute("touch new.txt"), "Файл new.txt создан.\n")
+        self.assertEqual(self.shell.execute("sync"), "Записано файлов: 1\n")
+        self.assertEqual(self.shell.execute("ls"), "file1.txt\nnew.txt\n")
+        self.assertIn("Неизвестная команда", self.shell.execute("rm new.txt"))
+
+    def test_touch_batch(self):
+        for i in range(3):
+            self.shell.execute(f"touch dir2/new{i}.txt")
+        self.assertIn("Файл уже существует", self.shell.execute("touch dir2/new0.txt"))
+        self.assertNotIn("dir2/new0.txt", self.shell.myzip.namelist())
+        self.assertEqual(self.shell.execute("cat dir2/new1.txt"), "")
+        self.assertEqual(self.shell.execute("sync"), "Записано файлов: 3\n")
+        self.assertIn("dir2/new2.txt", self.shell.myzip.namelist())
+        self.assertEqual(self.shell.execute("sync"), "sync: нет изменений\n")
+
+    def test_sync_file(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "test.zip")
+            with open(path, "wb") as archive:
+                archive.write(self.test_zip.getvalue())
+            shell = ZipShell(ZipFile(path, 'a'))
+            shell.execute("touch dir1/a.txt")
+            shell.execute("exit")  # exit записывает накопленные файлы
+            shell.myzip.close()
+            self.assertEqual(os.listdir(workdir), ["test.zip"])  # Временный файл удалён
+            with ZipFile(path) as myzip:
+                self.assertIn("dir1/a.txt", myzip.namelist())
+                self.assertEqual(myzip.read("dir1/file1.txt"), b"Content of file1")
+
+    def test_sync_keeps_mode(self):
+        # Архив заменяется временным файлом, права исходного файла сохраняются
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "test.zip")
+            with open(path, "wb") as archive:
+                archive.write(self.test_zip.getvalue())
+            os.chmod(path, 0o644)
+            shell = ZipShell(ZipFile(path, 'a'))
+            shell.execute("touch dir1/a.txt")
+            shell.execute("sync")
+            shell.myzip.close()
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o644)
+
+    def test_readonly(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "test.zip")
+            with ZipFile(path, 'w') as zipf:
+                zipf.writestr("dir1/stored.txt", "Несжатый файл")
+                zipf.writestr("dir1/packed.txt", "Сжатый файл", ZIP_DEFLATED)
+            shell = ZipShell(open_archive(path, readonly=True))
+            self.assertEqual(shell.execute("ls"), "dir1\n")
+            self.assertEqual(shell.execute("cat dir1/stored.txt"), "Несжатый файл\n")
+            self.assertEqual(shell.execute("cat dir1/packed.txt"), "Сжатый файл\n")
+            self.assertIn("только для чтения", shell.execute("touch dir1/new.txt"))
+            with open_member(shell.myzip, "dir1/stored.txt") as member:
+                self.assertIsInstance(member.read(4), memoryview)
+            close_archive(shell.myzip)
+
+    def test_find(self):
+        self.assertEqual(self.shell.execute("find *.txt"), "dir1/file1.txt\ndir2/file3.txt\n")
+        self.assertEqual(self.shell.execute("find dir*/file3*"), "dir2/file3.txt\n")
+        self.shell.execute("cd dir1")
+        self.assertEqual(self.shell.execute("find /dir?"), "dir1/\ndir2/\n")
+
+    def test_grep(self):
+        self.assertEqual(self.shell.execute("grep file[13]"),
+                         "dir1/file1.txt:1:Content of file1\ndir2/file3.txt:1:Content of file3\n")
+        self.assertEqual(self.shell.execute("grep file dir2/file3.txt"), "dir2/file3.txt:1:Content of file3\n")
+        self.assertIn("неверный шаблон", self.shell.execute("grep ("))
+        self.shell.grep_max_bytes = 10
+        self.assertIn("пропущен", self.shell.execute("grep file"))
+
+    def test_grep_pool(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "test.zip")
+            with ZipFile(path, 'w') as zipf:
+                for i in range(200):
+                    zipf.writestr(f"dir/f{i}.txt", f"line\nneedle {i}\n" if i % 50 == 0 else "line\n")
+            shell = ZipShell(open_archive(path), grep_workers=2)
+            found = sorted(shell.execute("grep needle").splitlines())
+            shell.close()
+        self.assertEqual(found, [f"dir/f{i}.txt:2:needle {i}" for i in (0, 100, 150, 50)])
+
+    def test_grep_during_touch(self):
+        # grep и find обходят индекс в фоновом потоке, а touch добавляет в него файлы из потока интерфейса
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "test.zip")
+            with ZipFile(path, 'w') as zipf:
+                for i in range(2000):
+                    zipf.writestr(f"dir/f{i}.txt", "x")
+            # Все файлы больше grep_max_bytes: grep только перебирает индекс и не читает архив
+            shell = ZipShell(open_archive(path), grep_workers=1, grep_max_bytes=0)
+            errors = []
+
+            def search():
+                try:
+                    for _ in range(20):
+                        shell.execute("grep x dir")
+                        shell.execute("find *.txt")
+                except RuntimeError as e:
+                    errors.append(e)
+
+            interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-5)  # Частые переключения потоков, чтобы touch попадал в середину обхода
+            thread = threading.Thread(target=search)
+            try:
+                thread.start()
+                count = 0
+                while thread.is_alive():
+                    shell.execute(f"touch dir/new{count}.txt")
+                    count += 1
+                thread.join()
+            finally:
+                sys.setswitchinterval(interval)
+            shell.pending.clear()  # Созданные файлы записывать не нужно
+            shell.close()
+        self.assertEqual(errors, [])
+        self.assertGreater(count, 0)
+
+    def test_run_script(self):
+        out = StringIO()
+        run_script(self.shell, ["# комментарий", "cd dir2", "", "ls", "exit", "ls"], out, echo=True)
+        self.assertEqual(out.getvalue(), "> cd dir2\n> ls\nfile3.txt\n> exit\n")
+        self.assertFalse(self.shell.running)
+
+    def test_profile(self):
+        # --profile json: время по командам, открытие архива и число файлов
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "a.zip")
+            with ZipFile(path, "w") as zipf:
+                zipf.writestr("dir/a.txt", "a\n")
+            report_path = os.path.join(workdir, "profile.json")
+            with profiling("zipshell", "json", report_path):
+                shell = ZipShell(open_archive(path))
+                run_script(shell, ["ls", "cat dir/a.txt", "cat dir/a.txt"], StringIO())
+                shell.close()
+            with open(report_path, encoding="utf-8") as file:
+                report = json.load(file)
+        self.assertEqual(report["phases"]["command.cat"]["calls"], 2)
+        self.assertIn("open", report["phases"])
+        self.assertEqual(report["counters"]["members"], 1)
+
+
+class TestMemberCache(unittest.TestCase):
+    def test_lru(self):
+        cache = MemberCache(budget=3 * sys.getsizeof("a" * 10))
+        for name in "abc":
+            cache.put((name, 0, ()), name * 10)
+        cache.get(("a", 0, ()))  # "a" становится самым свежим
+        cache.put(("d", 0, ()), "d" * 10)
+        self.assertIsNone(cache.get(("b", 0, ())))
+        self.assertEqual(cache.get(("a", 0, ())), "a" * 10)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (2, 1, 1))
+
+    def test_invalidate(self):
+        cache = MemberCache()
+        cache.put(("a", 1, ()), "old")
+        cache.put(("a", 2, ()), "new")  # Новая версия файла вытесняет старую
+        self.assertEqual(len(cache.entries), 1)
+        cache.invalidate("a")
+        self.assertEqual(cache.used, 0)
+
+    def test_shell_cat(self):
+        test_zip = BytesIO()
+        with ZipFile(test_zip, 'w') as zipf:
+            zipf.writestr("file.txt", "Содержимое")
+        shell = ZipShell(ZipFile(test_zip, 'a'))
+        for _ in range(3):
+            self.assertEqual(shell.execute("cat file.txt"), "Содержимое\n")
+        self.assertIn("попаданий 2, промахов 1", shell.execute("cachestat"))
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.test_zip = BytesIO()
+        with ZipFile(self.test_zip, 'w', ZIP_DEFLATED) as zipf:
+            zipf.writestr("text.txt", "".join(f"строка {i}\n" for i in range(100)))
+        self.myzip = ZipFile(self.test_zip)
+
+    def test_multibyte_chunks(self):
+        # Куски по 3 байта режут двухбайтовые символы кириллицы
+        text = "".join(iter_text(self.myzip, "text.txt", chunk_size=3))
+        self.assertEqual(text, self.myzip.read("text.txt").decode())
+
+    def test_limit(self):
+        text = "".join(iter_text(self.myzip, "text.txt", limit=3))
+        self.assertEqual(text, "с")  # Половина второго символа отброшена
+
+    def test_head_tail(self):
+        self.assertEqual("".join(head_stream(self.myzip, "text.txt", 2)), "строка 0\nстрока 1\n")
+        self.assertEqual("".join(tail_stream(self.myzip, "text.txt", 1)), "строка 99\n")
+
+
+class TestDirIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_zip = BytesIO()
+        with ZipFile(self.test_zip, 'w', ZIP_DEFLATED) as zipf:
+            zipf.writestr("lol", "")
+            zipf.writestr("lol/ostrov/404/", "")
+            zipf.writestr("lol/ostrov/shans.txt", "a" * 100)
+            zipf.writestr("lol/Tim/kim", "12345")
+            zipf.writestr("ug/", "")
+        self.myzip = ZipFile(self.test_zip, 'a')
+        self.index = DirIndex(self.myzip.infolist())
+
+    def test_list_dir(self):
+        self.assertEqual(self.index.list_dir(""), ["lol", "ug"])
+        self.assertEqual(self.index.list_dir("lol/"), ["Tim", "ostrov"])
+        self.assertEqual(self.index.list_dir("lol/ostrov/"), ["404", "shans.txt"])
+        self.assertEqual(self.index.list_dir("ug/"), [])
+
+    def test_find(self):
+        self.assertIsNotNone(self.index.find("lol/ostrov/404/"))
+        self.assertIsNone(self.index.find("lol/Tim/kim/"))  # Файл, а не каталог
+        self.assertIsNone(self.index.find("nope/"))
+
+    def test_add(self):
+        self.index.add("ug/new/file.txt")
+        self.assertEqual(self.index.list_dir("ug/"), ["new"])
+        self.assertEqual(self.index.list_dir("ug/new/"), ["file.txt"])
+
+    def test_sizes(self):
+        for dir_path in ["", "lol/", "lol/ostrov/", "lol/Tim/", "ug/"]:
+            self.assertEqual(self.index.find(dir_path).size, get_dir_size(self.myzip, dir_path))
+        self.assertLess(self.index.find("lol/ostrov/").compressed, 100)
+
+    def test_sizes_update(self):
+        compressed = self.index.find("").compressed
+        self.index.add("lol/Tim/new.txt", 10, 12)
+        self.index.add("lol/Tim/new.txt", 4, 6)  # Перезапись учитывается один раз
+        self.assertEqual(self.index.find("lol/Tim/").size, 9)
+        self.assertEqual(self.index.find("").size, 109)
+        self.assertEqual(self.index.find("").compressed, compressed + 6)
+
+    def test_walk(self):
+        paths = [path for path, size, compressed in self.index.walk("lol/", with_files=True)]
+        self.assertEqual(paths, ["lol/Tim/kim", "lol/Tim/", "lol/ostrov/shans.txt", "lol/ostrov/404/",
+                                 "lol/ostrov/", "lol/"])
+
+
 if __name__ == "__main__":
     unittest.main()
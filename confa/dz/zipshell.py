@@ -0,0 +1,681 @@
+import argparse
+import codecs
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fnmatch import fnmatchcase
+from zipfile import ZIP_STORED, ZipFile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Общий модуль instrument.py в confa
+from instrument import add_profile_arguments, metrics, profiling
+
+CHUNK_SIZE = 64 * 1024  # Размер куска при потоковом чтении файла из архива
+CAT_MAX_BYTES = 8 * 1024 * 1024  # Сколько байт файла cat выводит максимум
+PAGE_LINES = 40  # Строк на одной странице less
+PAGE_BREAK = object()  # Метка конца страницы в потоке вывода
+SYNC_INTERVAL = 5.0  # Через сколько секунд накопленные touch записываются в архив
+CACHE_BYTES = 32 * 1024 * 1024  # Память под кэш содержимого файлов для cat по умолчанию
+GREP_MAX_BYTES = 16 * 1024 * 1024  # Файлы крупнее grep пропускает
+GREP_BATCH = 64  # Сколько файлов обрабатывает процесс пула за одну задачу
+
+def get_dir_size(myzip, dir_path):
+    # Полный проход по архиву; du берёт готовые суммы из DirIndex
+    total_size = 0
+    for info in myzip.infolist():
+        if info.filename.startswith(dir_path):
+            total_size += info.file_size
+    return total_size
+
+class MappedFile:
+    # Файловый объект поверх mmap для режима только чтения: ZipFile разбирает
+    # центральный каталог прямо из отображённого в память архива
+    def __init__(self, path):
+        self.name = path
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.read = self.map.read
+        self.seek = self.map.seek
+        self.tell = self.map.tell
+
+    def seekable(self):
+        return True
+
+    def view(self, info):
+        # Данные несжатого файла - срез memoryview без копирования.
+        # Начало данных берётся из локального заголовка: 30 байт + имя + extra
+        name_len, extra_len = struct.unpack_from('<HH', self.map, info.header_offset + 26)
+        start = info.header_offset + 30 + name_len + extra_len
+        return memoryview(self.map)[start:start + info.compress_size]
+
+    def close(self):
+        self.map.close()
+
+class MemberView:
+    # Чтение несжатого файла архива кусками-срезами memoryview
+    def __init__(self, view):
+        self.view = view
+        self.pos = 0
+
+    def read(self, size):
+        chunk = self.view[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.view.release()  # Иначе отображение нельзя будет закрыть
+
+def open_archive(path, readonly=False):
+    with metrics.phase("open"):
+        if readonly:
+            return ZipFile(MappedFile(path))
+        return ZipFile(path, 'a')
+
+def close_archive(myzip):
+    # ZipFile не закрывает переданный ему файловый объект, отображение закрываем сами
+    fp = myzip.fp
+    myzip.close()
+    if isinstance(fp, MappedFile):
+        fp.close()
+
+def open_member(myzip, path):
+    info = myzip.getinfo(path)
+    if isinstance(myzip.fp, MappedFile) and info.compress_type == ZIP_STORED and not info.flag_bits & 1:
+        return MemberView(myzip.fp.view(info))
+    return myzip.open(info)
+
+def iter_text(myzip, path, limit=None, chunk_size=CHUNK_SIZE):
+    # Потоковое чтение файла из архива кусками через ZipFile.open()
+    # (несжатые файлы в режиме только чтения - срезами отображения).
+    # Инкрементальный декодер склеивает многобайтовые символы на границе кусков
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    remaining = limit
+    with open_member(myzip, path) as member:
+        while remaining is None or remaining > 0:
+            chunk = member.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+    if remaining is None or remaining > 0:  # При обрезке по limit недочитанный символ отбрасываем
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+
+def iter_line_batches(myzip, path):
+    # Полные строки файла пачками - по одной пачке на прочитанный кусок
+    rest = ''
+    for text in iter_text(myzip, path):
+        lines = (rest + text).split('\n')
+        rest = lines.pop()
+        yield [line + '\n' for line in lines]
+    if rest:
+        yield [rest + '\n']
+
+class MemberCache:
+    # LRU-кэш раскодированного содержимого файлов, ограниченный по памяти.
+    # Ключ - путь, CRC и дата из ZipInfo: перезаписанный файл в кэш не попадёт
+    def __init__(self, budget=CACHE_BYTES):
+        self.budget = budget
+        self.entries = OrderedDict()  # Ключ -> (текст, занятая память)
+        self.keys = {}  # Путь -> ключ, для сброса при записи файла
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def fits(self, size):
+        return size <= self.budget
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, text):
+        cost = sys.getsizeof(text)
+        if cost > self.budget:
+            return
+        self.invalidate(key[0])
+        while self.used + cost > self.budget:
+            old_key, (_, old_cost) = self.entries.popitem(last=False)
+            del self.keys[old_key[0]]
+            self.used -= old_cost
+            self.evictions += 1
+        self.entries[key] = (text, cost)
+        self.keys[key[0]] = key
+        self.used += cost
+
+    def invalidate(self, path):
+        key = self.keys.pop(path, None)
+        if key is not None:
+            self.used -= self.entries.pop(key)[1]
+
+    def stats(self):
+        return (f"Кэш: попаданий {self.hits}, промахов {self.misses}, вытеснений {self.evictions}, "
+                f"файлов {len(self.entries)}, занято {self.used} из {self.budget} байт\n")
+
+def cat_stream(myzip, path, file_name, cache=None):
+    info = myzip.getinfo(path)
+    if cache is not None and info.file_size <= CAT_MAX_BYTES and cache.fits(info.file_size):
+        key = (path, info.CRC, info.date_time)
+        text = cache.get(key)
+        if text is None:
+            parts = []
+            for text in iter_text(myzip, path):
+                parts.append(text)
+                yield text
+            text = "".join(parts)
+            cache.put(key, text)
+        else:
+            yield text
+    else:
+        yield from iter_text(myzip, path, limit=CAT_MAX_BYTES)
+    yield '\n'
+    if info.file_size > CAT_MAX_BYTES:
+        yield f"cat: {file_name}: вывод обрезан после {CAT_MAX_BYTES} байт\n"
+
+def head_stream(myzip, path, count):
+    for batch in iter_line_batches(myzip, path):
+        if count <= 0:
+            break
+        yield ''.join(batch[:count])
+        count -= len(batch)
+
+def tail_stream(myzip, path, count):
+    lines = deque(maxlen=count)  # В памяти только последние count строк
+    for batch in iter_line_batches(myzip, path):
+        lines.extend(batch)
+        yield ''  # Отдаём управление циклу событий между кусками
+    yield ''.join(lines)
+
+def less_stream(myzip, path):
+    page = []
+    for batch in iter_line_batches(myzip, path):
+        for line in batch:
+            page.append(line)
+            if len(page) == PAGE_LINES:
+                yield ''.join(page)
+                yield PAGE_BREAK
+                page = []
+    yield ''.join(page) + "(END)\n"
+
+_worker_zip = None  # Свой ZipFile в каждом процессе пула grep
+
+def grep_worker_init(path):
+    global _worker_zip
+    _worker_zip = ZipFile(path)
+
+def grep_members(names, pattern, myzip=None):
+    # Поиск по пачке файлов архива. В процессе пула используется его собственный ZipFile
+    myzip = myzip or _worker_zip
+    regex = re.compile(pattern)
+    found = []
+    for name in names:
+        text = myzip.read(name).decode('utf-8', errors='replace')
+        for line_num, line in enumerate(text.splitlines(), 1):
+            if regex.search(line):
+                found.append(f"{name}:{line_num}:{line}\n")
+    return found
+
+class DirNode:
+    __slots__ = ("dirs", "files", "size", "compressed")
+
+    def __init__(self):
+        self.dirs = {}  # Подкаталоги: имя -> DirNode
+        self.files = {}  # Файлы каталога: имя -> (размер, сжатый размер)
+        self.size = 0  # Суммарный размер поддерева в байтах
+        self.compressed = 0  # Суммарный сжатый размер поддерева
+
+class DirIndex:
+    # Префиксное дерево каталогов архива: строится один раз при открытии,
+    # ls и cd обращаются только к детям текущего каталога, du - к суммам узла.
+    # touch добавляет файлы из потока интерфейса, пока grep и find обходят дерево в фоновом потоке:
+    # add() и такие обходы выполняются под lock
+    def __init__(self, infos=()):
+        self.root = DirNode()
+        self.lock = threading.Lock()
+        for info in infos:
+            self.add(info.filename, info.file_size, info.compress_size)
+
+    def add(self, name, size=0, compressed=0):
+        parts = name.split('/')
+        with self.lock:
+            path = [self.root]
+            for part in parts[:-1]:
+                child = path[-1].dirs.get(part)
+                if child is None:
+                    child = path[-1].dirs[part] = DirNode()
+                path.append(child)
+            if parts[-1]:  # Имя с '/' на конце - это запись каталога, а не файл
+                old_size, old_compressed = path[-1].files.get(parts[-1], (0, 0))
+                path[-1].files[parts[-1]] = (size, compressed)
+                size -= old_size  # Перезапись файла учитываем разницей размеров
+                compressed -= old_compressed
+            for node in path:
+                node.size += size
+                node.compressed += compressed
+
+    def find(self, dir_path):
+        # dir_path в формате current_dir: "" для корня или "a/b/"
+        node = self.root
+        if dir_path:
+            for part in dir_path[:-1].split('/'):
+                node = node.dirs.get(part)
+                if node is None:
+                    return None
+        return node
+
+    def file_size(self, path):
+        dir_path, _, name = path.rpartition('/')
+        node = self.find(dir_path + '/' if dir_path else "")
+        return node.files[name][0]
+
+    def list_dir(self, dir_path):
+        node = self.find(dir_path)
+        if node is None:
+            return []
+        return sorted(node.dirs.keys() | node.files.keys())
+
+    def walk(self, dir_path, with_files=False):
+        # Обход поддерева в порядке du: сначала содержимое, затем сам каталог.
+        # Возвращает тройки (путь, размер, сжатый размер)
+        node = self.find(dir_path)
+        if node is None:
+            return
+        stack = [(dir_path, node, False)]
+        while stack:
+            path, node, visited = stack.pop()
+            if visited:
+                yield path, node.size, node.compressed
+                continue
+            stack.append((path, node, True))
+            for name in sorted(node.dirs, reverse=True):
+                stack.append((path + name + '/', node.dirs[name], False))
+            if with_files:
+                for name in sorted(node.files):
+                    size, compressed = node.files[name]
+                    yield path + name, size, compressed
+
+    def files(self, dir_path):
+        # Все файлы поддерева: пары (путь, размер)
+        node = self.find(dir_path)
+        stack = [(dir_path, node)] if node is not None else []
+        while stack:
+            path, node = stack.pop()
+            for name, (size, _) in node.files.items():
+                yield path + name, size
+            for name, child in node.dirs.items():
+                stack.append((path + name + '/', child))
+
+    def glob(self, dir_path, pattern):
+        # find: шаблон без '/' сравнивается с именами на любой глубине,
+        # шаблон с '/' - по частям пути, так что обходятся только подходящие ветви
+        if pattern.startswith('/'):
+            dir_path, pattern = "", pattern.strip('/')
+        start = self.find(dir_path)
+        if start is None:
+            return
+        parts = pattern.split('/')
+        nodes = [(dir_path, start)]
+        for part in parts[:-1]:
+            nodes = [(path + name + '/', child) for path, node in nodes
+                     for name, child in sorted(node.dirs.items()) if fnmatchcase(name, part)]
+        stack = nodes[::-1]
+        while stack:
+            path, node = stack.pop()
+            for name in sorted(node.dirs.keys() | node.files.keys()):
+                if fnmatchcase(name, parts[-1]):
+                    yield path + name + ('/' if name not in node.files else '')
+            if len(parts) == 1:  # Имя ищется и во вложенных каталогах
+                stack.extend((path + name + '/', node.dirs[name]) for name in sorted(node.dirs, reverse=True))
+
+class ZipShell:
+    # Интерпретатор команд над ZIP-архивом без графического интерфейса.
+    # run() возвращает пару (вывод, поток): вывод команд, которым хватает индекса,
+    # готов сразу, а чтение и запись архива отдаются генератором, который
+    # вызывающий код выполняет сам (GUI - в фоновом потоке, пакетный режим - сразу).
+    # Генератор отдаёт куски текста и PAGE_BREAK (пауза less).
+    # Новые файлы touch копятся в pending и записываются одним пакетом
+    # командой sync, по таймеру (sync_due) или при exit
+    def __init__(self, myzip, cache_bytes=CACHE_BYTES, grep_workers=None, grep_max_bytes=GREP_MAX_BYTES):
+        self.myzip = myzip
+        self.cache = MemberCache(cache_bytes)
+        self.grep_workers = grep_workers or os.cpu_count() or 1
+        self.grep_max_bytes = grep_max_bytes
+        self.pool = None  # Пул процессов grep, создаётся при первом поиске
+        self.current_dir = ""
+        self.running = True  # Сбрасывается командой exit
+        self.pending = {}  # Ещё не записанные файлы: путь -> содержимое
+        self.last_sync = time.monotonic()
+
+    @property
+    def myzip(self):
+        return self._myzip
+
+    @myzip.setter
+    def myzip(self, zip_file):
+        # При открытии архива один раз строим индекс каталогов
+        self._myzip = zip_file
+        with metrics.phase("index"):
+            infos = zip_file.infolist()
+            self.index = DirIndex(infos)
+            self.names = {info.filename for info in infos}  # Для проверки существования файла
+        metrics.count("members", len(infos))
+
+    def run(self, command):
+        if command == 'ls':
+            items = self.index.list_dir(self.current_dir)
+            return "\n".join(items) + "\n", None
+        elif command == "exit":
+            self.running = False
+            return "", self.commit() if self.pending else None
+        elif command == "sync":
+            return "", self.commit()
+        elif command == "cachestat":
+            return self.cache.stats(), None
+        elif command.startswith(('cat ', 'head ', 'tail ', 'less ')):
+            return self.read_command(command.split())
+        elif command.startswith('find '):
+            return "", self.find_stream(command.split()[1])
+        elif command.startswith('grep '):
+            return self.grep_command(command.split()[1:])
+        elif command.startswith('cd '):
+            target_dir = command.split()[1]
+            new_dir = self.resolve_dir(target_dir)
+            if self.index.find(new_dir) is not None:
+                self.current_dir = new_dir
+                return "", None
+            return f"cd: {target_dir}: Нет такого файла или каталога\n", None
+        elif command == "du":
+            size = self.index.find(self.current_dir).size
+            return f"Размер текущей директории: {size} байт\n", None
+        elif command.startswith('du '):
+            return self.du_command(command.split()[1:])
+        elif command.startswith('touch '):
+            file_name = command.split()[1]
+            return self.touch(self.resolve_path(file_name), file_name), None
+        return f"Неизвестная команда: {command}\n", None
+
+    def read_command(self, args):
+        # cat <файл>, head/tail [-n N] <файл>, less <файл>: файл читается кусками
+        name, file_path = args[0], args[-1]
+        count = 10
+        if name in ('head', 'tail') and len(args) == 4 and args[1] == '-n' and args[2].isdigit():
+            count = int(args[2])
+        elif len(args) != 2:
+            return f"{name}: неверные аргументы\n", None
+        full_path = self.resolve_path(file_path)
+        if full_path not in self.names:
+            return f"{name}: {file_path}: Нет такого файла\n", None
+        return "", self.read_stream(name, full_path, file_path, count)
+
+    def read_stream(self, name, full_path, file_path, count):
+        # Выполняется позже, когда вызывающий код дойдёт до генератора:
+        # sync к этому моменту мог записать файл и заменить объект ZipFile
+        if full_path in self.pending:
+            return  # Файл создан touch и ещё не записан: он пустой
+        if name == 'cat':
+            yield from cat_stream(self.myzip, full_path, file_path, self.cache)
+        elif name == 'head':
+            yield from head_stream(self.myzip, full_path, count)
+        elif name == 'tail':
+            yield from tail_stream(self.myzip, full_path, count)
+        else:
+            yield from less_stream(self.myzip, full_path)
+
+    def find_stream(self, pattern):
+        with self.index.lock:  # Весь список сразу: между кусками вывода touch может менять индекс
+            paths = list(self.index.glob(self.current_dir, pattern))
+        lines = []
+        for path in paths:
+            lines.append(path + "\n")
+            if len(lines) == 1000:
+                yield "".join(lines)
+                lines = []
+        yield "".join(lines)
+
+    def grep_command(self, args):
+        # grep <регулярное выражение> [файл или каталог]
+        if not 1 <= len(args) <= 2:
+            return "grep: используйте grep <шаблон> [путь]\n", None
+        try:
+            re.compile(args[0])
+        except re.error as e:
+            return f"grep: неверный шаблон: {e}\n", None
+        target = args[1] if len(args) == 2 else "."
+        full_path = self.resolve_path(target)
+        if full_path in self.names and not full_path.endswith('/'):
+            return "", self.grep_stream(args[0], full_path, None)
+        dir_path = self.current_dir if target == "." else self.resolve_dir(target)
+        if self.index.find(dir_path) is None:
+            return f"grep: {target}: Нет такого файла или каталога\n", None
+        return "", self.grep_stream(args[0], None, dir_path)
+
+    def grep_stream(self, pattern, file_path, dir_path):
+        # Файл file_path или все файлы поддерева dir_path. Список файлов собирается уже здесь,
+        # в фоновом потоке: на больших архивах это долгий проход по индексу.
+        # Пока он идёт, touch из потока интерфейса ждёт lock индекса.
+        # Файлы делятся на пачки; при архиве на диске пачки разбирает пул процессов,
+        # совпадения выдаются по мере готовности пачек
+        if file_path is not None:
+            members = [(file_path, self.index.file_size(file_path))]
+        else:
+            with self.index.lock:
+                members = sorted(self.index.files(dir_path))
+        names = []
+        skipped = []
+        for name, size in members:
+            if size > self.grep_max_bytes:
+                skipped.append(f"grep: {name}: пропущен, больше {self.grep_max_bytes} байт\n")
+            elif name not in self.pending:  # Ещё не записанные файлы пусты
+                names.append(name)
+        if skipped:
+            yield "".join(skipped)
+        batches = [names[i:i + GREP_BATCH] for i in range(0, len(names), GREP_BATCH)]
+        path = self.myzip.filename
+        if self.grep_workers > 1 and len(batches) > 1 and path and os.path.isfile(path):
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(self.grep_workers, initializer=grep_worker_init,
+                                                initargs=(path,))
+            futures = [self.pool.submit(grep_members, batch, pattern) for batch in batches]
+            try:
+                for future in as_completed(futures):
+                    yield "".join(future.result())
+            finally:
+                for future in futures:  # При отмене команды оставшиеся пачки не нужны
+                    future.cancel()
+        else:
+            for batch in batches:
+                yield "".join(grep_members(batch, pattern, self.myzip))
+
+    def close_pool(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def close(self):
+        self.close_pool()
+        close_archive(self.myzip)
+
+    def touch(self, full_path, file_name):
+        if self.myzip.mode == 'r':
+            return f"touch: {file_name}: архив открыт только для чтения\n"
+        if full_path in self.names:
+            return f"touch: {file_name}: Файл уже существует\n"
+        self.names.add(full_path)
+        self.pending[full_path] = b""
+        self.index.add(full_path)
+        return f"Файл {file_name} создан.\n"
+
+    def sync_due(self):
+        return bool(self.pending) and time.monotonic() - self.last_sync >= SYNC_INTERVAL
+
+    def commit(self):
+        # Запись накопленных файлов одним пакетом. Архив на диске не меняется
+        # на месте: копия с новыми файлами пишется во временный файл рядом
+        # и подменяет архив через os.replace, так что сбой не портит архив
+        pending, self.pending = self.pending, {}  # touch во время записи попадёт в новый пакет
+        if not pending:
+            yield "sync: нет изменений\n"
+            return
+        try:
+            self.write_pending(pending)
+        except BaseException:
+            self.pending = {**pending, **self.pending}
+            raise
+        self.last_sync = time.monotonic()
+        yield f"Записано файлов: {len(pending)}\n"
+
+    def write_pending(self, pending):
+        path = self.myzip.filename
+        if path and os.path.isfile(path):
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+            os.close(fd)
+            try:
+                shutil.copyfile(path, temp_path)
+                with ZipFile(temp_path, 'a') as new_zip:
+                    for name, data in pending.items():
+                        new_zip.writestr(name, data)
+                with open(temp_path, 'rb+') as temp_file:
+                    os.fsync(temp_file.fileno())
+                shutil.copymode(path, temp_path)  # mkstemp создаёт файл с правами 0600
+                self._myzip.close()
+                self.close_pool()  # Процессы пула держат открытым старый файл архива
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            self._myzip = ZipFile(path, 'a')  # Индекс уже учитывает новые файлы
+        else:  # Архив в памяти: дописываем напрямую
+            for name, data in pending.items():
+                self.myzip.writestr(name, data)
+        for name in pending:
+            self.cache.invalidate(name)
+
+    def du_command(self, args):
+        # du -s [каталог]: итог по каталогу; du -a [каталог]: все каталоги и файлы поддерева.
+        # Размеры берутся из сумм DirIndex, выводятся исходный и сжатый размер
+        flags = [arg for arg in args if arg.startswith('-')]
+        paths = [arg for arg in args if not arg.startswith('-')]
+        if not flags or any(flag not in ('-a', '-s') for flag in flags):
+            return "du: используйте du, du -s [каталог] или du -a [каталог]\n", None
+        target_dir = paths[0] if paths else "."
+        dir_path = self.current_dir if target_dir == "." else self.resolve_dir(target_dir)
+        node = self.index.find(dir_path)
+        if node is None:
+            return f"du: {target_dir}: Нет такого файла или каталога\n", None
+        if '-s' in flags:
+            return f"размер\tсжато\tпуть\n{node.size}\t{node.compressed}\t{dir_path or '/'}\n", None
+        return "", self.du_all(dir_path)
+
+    def du_all(self, dir_path):
+        lines = ["размер\tсжато\tпуть\n"]
+        for path, size, compressed in self.index.walk(dir_path, with_files=True):
+            lines.append(f"{size}\t{compressed}\t{path or '/'}\n")
+            if len(lines) == 1000:
+                yield "".join(lines)
+                lines = []
+        yield "".join(lines)
+
+    def resolve_path(self, file_path):
+        if file_path.startswith("/"):
+            return file_path.lstrip("/")
+        return self.current_dir + file_path
+
+    def resolve_dir(self, target_dir):
+        # Путь каталога в формате current_dir: "" для корня или "a/b/"
+        if target_dir.startswith("/"):
+            new_dir = target_dir.strip("/")
+        else:
+            new_dir = (self.current_dir + target_dir).strip("/")
+        return new_dir + "/" if new_dir else ""
+
+    def execute(self, command):
+        # Выполнение команды целиком, как в пакетном режиме: весь вывод одной строкой
+        text, stream = self.run(command)
+        parts = [text]
+        for item in stream or ():
+            if item is not PAGE_BREAK:
+                parts.append(item)
+        return "".join(parts)
+
+def run_script(shell, lines, out, echo=False):
+    # Пакетный режим: команды по одной в строке, пустые строки и строки с # пропускаются
+    for line in lines:
+        command = line.strip()
+        if not command or command.startswith('#'):
+            continue
+        if echo:
+            out.write(f"> {command}\n")
+        with metrics.phase("command." + command.split()[0]):  # Время по именам команд: command.cat и т. д.
+            out.write(shell.execute(command))
+        if not shell.running:
+            return
+        if shell.sync_due():
+            with metrics.phase("sync"):
+                for _ in shell.commit():
+                    pass
+    if shell.pending:  # Скрипт закончился без exit
+        with metrics.phase("sync"):
+            for _ in shell.commit():
+                pass
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run ZIP shell commands against an archive without a GUI.")
+    parser.add_argument("archive", help="Path to the ZIP archive.")
+    parser.add_argument("script", nargs="?", help="File with one command per line (stdin if omitted).")
+    parser.add_argument("--echo", action="store_true", help="Print each command before its output.")
+    add_shell_arguments(parser)
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+def add_shell_arguments(parser):
+    # Общие настройки ZipShell для пакетного режима и окна
+    parser.add_argument("--readonly", action="store_true", help="Open the archive read-only via mmap.")
+    parser.add_argument("--cache-mb", type=float, default=CACHE_BYTES / 2 ** 20,
+                        help="Memory budget of the cat content cache in MB.")
+    parser.add_argument("--grep-workers", type=int, default=None,
+                        help="Number of grep worker processes (CPU count by default).")
+    parser.add_argument("--grep-max-mb", type=float, default=GREP_MAX_BYTES / 2 ** 20,
+                        help="Members larger than this are skipped by grep, in MB.")
+
+def shell_options(args):
+    return {
+        "cache_bytes": int(args.cache_mb * 2 ** 20),
+        "grep_workers": args.grep_workers,
+        "grep_max_bytes": int(args.grep_max_mb * 2 ** 20),
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    with profiling("zipshell", args.profile, args.profile_output):
+        shell = ZipShell(open_archive(args.archive, args.readonly), **shell_options(args))
+        try:
+            if args.script:
+                with open(args.script, encoding='utf-8') as script:
+                    run_script(shell, script, sys.stdout, args.echo)
+            else:
+                run_script(shell, sys.stdin, sys.stdout, args.echo)
+        finally:
+            shell.close()
+
+if __name__ == "__main__":
+    main()
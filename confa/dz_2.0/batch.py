@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import csv
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from commitcache import DEFAULT_CACHE_DIR
+from main import git_log_command, iter_commits, iter_plantuml, read_commits
+from plantumlpipe import RendererPool, pipe_command
+
+def read_jobs(jobs_path):
+    # Файл заданий в формате CSV: repo,before-date,output; пустые строки и # пропускаются
+    with open(jobs_path, newline="") as file:
+        return [row for row in csv.reader(file) if row and not row[0].lstrip().startswith("#")]
+
+def read_manifest(manifest_path, before_date, output_dir, image_format="png"):
+    # Манифест: по одному пути к репозиторию в строке; изображение называется по имени
+    # каталога репозитория, совпадающие имена получают номер
+    jobs = []
+    names = set()
+    with open(manifest_path) as file:
+        for line in file:
+            repo_path = line.strip()
+            if not repo_path or repo_path.startswith("#"):
+                continue
+            name = Path(repo_path).resolve().name
+            unique = name
+            number = 1
+            while unique in names:
+                number += 1
+                unique = f"{name}-{number}"
+            names.add(unique)
+            jobs.append((repo_path, before_date, os.path.join(output_dir, f"{unique}.{image_format}")))
+    return jobs
+
+def write_image(image, output_path):
+    output_dir = Path(output_path).parent
+    if not output_dir.exists():
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, "wb") as file:
+        file.write(image)
+
+def run_job(pool, repo_path, before_date, output_path, reader="git", cache_dir=DEFAULT_CACHE_DIR):
+    # Чтение истории и отрисовка одного графа; возвращает число коммитов и время этапов
+    start = time.perf_counter()
+    commits = list(read_commits(repo_path, before_date, reader, cache_dir))
+    read_time = time.perf_counter() - start
+    write_image(pool.render(iter_plantuml(commits)), output_path)
+    render_time = time.perf_counter() - start - read_time
+    return len(commits), read_time, render_time
+
+def run_batch(jobs, pool, workers, reader="git", cache_dir=DEFAULT_CACHE_DIR):
+    # Задания выполняются параллельно; ошибка одного задания не останавливает остальные.
+    # Результат: (задание, число коммитов, время чтения, время отрисовки, полное время, ошибка)
+    def timed(job):
+        start = time.perf_counter()
+        try:
+            commits, read_time, render_time = run_job(pool, *job, reader, cache_dir)
+            return job, commits, read_time, render_time, time.perf_counter() - start, None
+        except Exception as e:
+            return job, 0, 0.0, 0.0, time.perf_counter() - start, e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(timed, jobs))
+
+async def fetch_commits(repo_path, before_date):
+    # git log в асинхронном подпроцессе с cwd=, без смены текущей директории процесса
+    command = git_log_command(before_date)
+    process = await asyncio.create_subprocess_exec(*command, cwd=repo_path, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE)
+
+    async def read_lines():
+        return [line.decode("utf-8", errors="replace").rstrip("\n") async for line in process.stdout]
+
+    lines, stderr = await asyncio.gather(read_lines(), process.stderr.read())
+    returncode = await process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command, stderr=stderr.decode(errors="replace"))
+    return list(iter_commits(lines))
+
+async def run_manifest(jobs, pool, fetch_limit=16, render_limit=2):
+    # Истории всех репозиториев читаются одновременно (не больше fetch_limit подпроцессов),
+    # отрисовка - не больше render_limit графов сразу. Результат в формате run_batch
+    fetch_slots = asyncio.Semaphore(fetch_limit)
+    render_slots = asyncio.Semaphore(render_limit)
+    loop = asyncio.get_running_loop()
+
+    def render(commits, output_path):
+        write_image(pool.render(iter_plantuml(commits)), output_path)
+
+    async def run(job):
+        repo_path, before_date, output_path = job
+        start = time.perf_counter()
+        read_time = render_time = 0.0
+        commits = []
+        try:
+            async with fetch_slots:
+                commits = await fetch_commits(repo_path, before_date)
+            read_time = time.perf_counter() - start
+            async with render_slots:
+                render_start = time.perf_counter()
+                await loop.run_in_executor(None, render, commits, output_path)
+                render_time = time.perf_counter() - render_start
+            return job, len(commits), read_time, render_time, time.perf_counter() - start, None
+        except Exception as e:
+            return job, len(commits), read_time, render_time, time.perf_counter() - start, e
+
+    return await asyncio.gather(*(run(job) for job in jobs))
+
+def print_summary(results):
+    print(f"{'repository':<30} {'commits':>8} {'read, s':>8} {'render, s':>10} {'total, s':>9}  status")
+    failed = 0
+    for (repo_path, before_date, output_path), commits, read_time, render_time, total, error in results:
+        if error is None:
+            status = f"ok -> {output_path}"
+        else:
+            failed += 1
+            detail = getattr(error, "stderr", None) or str(error)
+            status = f"error: {detail.strip().splitlines()[-1] if detail.strip() else type(error).__name__}"
+        print(f"{repo_path:<30} {commits:>8} {read_time:>8.3f} {render_time:>10.3f} {total:>9.3f}  {status}")
+    print(f"{len(results) - failed} succeeded, {failed} failed")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render many commit graphs with resident PlantUML processes.")
+    parser.add_argument("--plantuml-path", required=True, help="Path to PlantUML jar file.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--jobs", help="CSV file with repo,before-date,output lines.")
+    source.add_argument("--manifest", help="File with one repository path per line; histories are fetched "
+                                           "concurrently with asyncio subprocesses.")
+    parser.add_argument("--before-date", help="Date used for every repository of the manifest (YYYY-MM-DD).")
+    parser.add_argument("--output-dir", default=".", help="Directory for the images of the manifest.")
+    parser.add_argument("--fetch-concurrency", type=int, default=16,
+                        help="Maximum number of git log processes running at once in manifest mode.")
+    parser.add_argument("--renderers", type=int, default=2,
+                        help="Number of resident PlantUML processes, also the bound on graphs rendered at once.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of jobs read and rendered at once.")
+    parser.add_argument("--format", choices=("png", "svg"), default="png", help="Image format.")
+    parser.add_argument("--reader", choices=("git", "native", "cache"), default="git",
+                        help="How to read the history, as in main.py.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory of the commit cache.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not Path(args.plantuml_path).is_file():
+        raise FileNotFoundError(f"PlantUML path '{args.plantuml_path}' does not exist or is not a file.")
+    if args.manifest:
+        if not args.before_date:
+            raise ValueError("--before-date is required with --manifest.")
+        jobs = read_manifest(args.manifest, args.before_date, args.output_dir, args.format)
+    else:
+        jobs = read_jobs(args.jobs)
+    pool = RendererPool(pipe_command(args.plantuml_path, args.format), args.renderers)
+    try:
+        if args.manifest:
+            results = asyncio.run(run_manifest(jobs, pool, args.fetch_concurrency, args.renderers))
+        else:
+            results = run_batch(jobs, pool, args.workers, args.reader, args.cache_dir)
+    finally:
+        pool.close()
+    print_summary(results)
+
+if __name__ == "__main__":
+    main()
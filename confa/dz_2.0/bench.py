@@ -0,0 +1,119 @@
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from main import (
+    fetch_commit_data,
+    parse_commit_data,
+    generate_plantuml,
+    iter_commit_lines,
+    iter_commits,
+    iter_plantuml,
+    write_plantuml,
+    render_puml
+)
+from gitstore import walk_commits
+from commitcache import CommitCache
+from svgrender import write_dot, write_svg
+
+BEFORE_DATE = "2100-01-01"
+
+def make_repo(repo_path, commits, merge_every=50):
+    # Синтетический репозиторий через git fast-import: пустые коммиты раз в минуту,
+    # каждый merge_every-й - слияние с коммитом на merge_every позиций раньше
+    os.makedirs(repo_path, exist_ok=True)
+    subprocess.run(["git", "init", "-q", repo_path], check=True)
+    stream = []
+    for mark in range(1, commits + 1):
+        timestamp = 1_600_000_000 + mark * 60
+        message = f"commit {mark}"
+        stream.append(f"commit refs/heads/master\nmark :{mark}\n"
+                      f"author Author{mark % 7} <a{mark % 7}@example.com> {timestamp} +0000\n"
+                      f"committer Author{mark % 7} <a{mark % 7}@example.com> {timestamp} +0000\n"
+                      f"data {len(message)}\n{message}\n")
+        if mark > 1:
+            stream.append(f"from :{mark - 1}\n")
+        if mark > merge_every and mark % merge_every == 0:
+            stream.append(f"merge :{mark - merge_every}\n")
+        stream.append("\n")
+    subprocess.run(["git", "fast-import", "--quiet"], input="".join(stream), text=True,
+                   cwd=repo_path, check=True)
+
+def run_buffered(repo_path, puml_path):
+    # Прежний путь: весь лог, словарь коммитов и текст диаграммы целиком в памяти
+    cwd = os.getcwd()
+    try:
+        commits = parse_commit_data(fetch_commit_data(repo_path, BEFORE_DATE))
+    finally:
+        os.chdir(cwd)
+    with open(puml_path, "w") as file:
+        file.write(generate_plantuml(commits))
+
+def run_streaming(repo_path, puml_path):
+    write_plantuml(iter_plantuml(iter_commits(iter_commit_lines(repo_path, BEFORE_DATE))), puml_path)
+
+def run_native(repo_path, puml_path):
+    write_plantuml(iter_plantuml(walk_commits(repo_path, BEFORE_DATE)), puml_path)
+
+def run_cached(repo_path, puml_path):
+    # Кэш лежит рядом с репозиторием: первый запуск читает всю историю, повторный - только HEAD
+    cache = CommitCache(repo_path, os.path.join(os.path.dirname(repo_path), "cache"))
+    cache.update()
+    write_plantuml(iter_plantuml(cache.query(BEFORE_DATE)), puml_path)
+
+def measure(pipeline, repo_path, puml_path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    pipeline(repo_path, puml_path)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+def run_renderers(repo_path, workdir, plantuml_path=None):
+    # Время и пик памяти отрисовки уже прочитанной истории: встроенные SVG и DOT против PlantUML
+    commits = list(walk_commits(repo_path, BEFORE_DATE))
+    renderers = {"svg": lambda path: write_svg(commits, path + ".svg"),
+                 "dot": lambda path: write_dot(commits, path + ".dot")}
+    if plantuml_path:
+        def plantuml(path):
+            write_plantuml(iter_plantuml(commits), path + ".puml")
+            render_puml(path + ".puml", plantuml_path, path + ".png")
+        renderers["plantuml"] = plantuml
+    results = {}
+    for name, render in renderers.items():
+        results[name] = measure(lambda repo, path: render(path), repo_path, os.path.join(workdir, "graph"))
+    return len(commits), results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare buffered, streaming and native commit ingestion.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Numbers of commits in the synthetic repositories.")
+    parser.add_argument("--plantuml-path", help="PlantUML jar; when given, rendering is also timed through Java.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    print(f"{'commits':>10} {'pipeline':>10} {'time, s':>8} {'peak, MB':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for commits in args.sizes:
+            repo_path = os.path.join(workdir, f"repo_{commits}")
+            make_repo(repo_path, commits)
+            puml_path = os.path.join(workdir, "graph.puml")
+            for name, pipeline in (("buffered", run_buffered), ("streaming", run_streaming),
+                                   ("native", run_native), ("cache cold", run_cached),
+                                   ("cache warm", run_cached)):
+                elapsed, peak = measure(pipeline, repo_path, puml_path)
+                print(f"{commits:>10} {name:>10} {elapsed:>8.3f} {peak:>9.1f}")
+        print()
+        print(f"{'nodes':>10} {'renderer':>10} {'time, s':>8} {'peak, MB':>9}")
+        for commits in args.sizes:
+            nodes, results = run_renderers(os.path.join(workdir, f"repo_{commits}"), workdir, args.plantuml_path)
+            for name, (elapsed, peak) in results.items():
+                print(f"{nodes:>10} {name:>10} {elapsed:>8.3f} {peak:>9.1f}")
+
+if __name__ == "__main__":
+    main()
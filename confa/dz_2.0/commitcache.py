@@ -0,0 +1,93 @@
+import bisect
+import hashlib
+import os
+import subprocess
+from pathlib import Path
+
+from gitstore import Commit, before_timestamp
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "git-graph"
+LOG_FORMAT = "--pretty=format:%H|%P|%an|%ad|%ct"  # Как в git log основного пути, плюс время коммиттера
+
+def git_output(repo_path, *args):
+    return subprocess.run(["git", *args], capture_output=True, text=True, check=True, cwd=repo_path).stdout
+
+def iter_log(repo_path, revision):
+    command = ["git", "log", revision, LOG_FORMAT, "--date=iso"]
+    with subprocess.Popen(command, stdout=subprocess.PIPE, text=True, cwd=repo_path) as process:
+        for line in process.stdout:
+            yield line.rstrip("\n")
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+def parse_record(line):
+    # Имя автора может содержать "|", поэтому дата и время отделяются справа
+    hash_, parents, rest = line.split("|", 2)
+    author, date, commit_time = rest.rsplit("|", 2)
+    return Commit(hash_, tuple(parents.split()), author, date), int(commit_time)
+
+class CommitCache:
+    # Разобранные коммиты репозитория на диске: <ключ>.log с записями в формате LOG_FORMAT
+    # (только дописывается) и <ключ>.tip с последним прочитанным HEAD.
+    # Новые запуски читают из git только коммиты после сохранённого HEAD
+    def __init__(self, repo_path, cache_dir=DEFAULT_CACHE_DIR):
+        self.repo_path = repo_path
+        key = hashlib.sha1(str(Path(repo_path).resolve()).encode()).hexdigest()[:16]
+        os.makedirs(cache_dir, exist_ok=True)
+        self.log_path = Path(cache_dir) / f"{key}.log"
+        self.tip_path = Path(cache_dir) / f"{key}.tip"
+        self.commits = {}  # hash -> (Commit, время коммиттера)
+        self.times = []  # Время коммиттера по возрастанию, для bisect
+        self.order = []  # Хеши в том же порядке
+        self.tip = None
+        self.load()
+
+    def load(self):
+        if not (self.log_path.exists() and self.tip_path.exists()):
+            return
+        self.tip = self.tip_path.read_text().strip()
+        with open(self.log_path, encoding="utf-8") as file:
+            for line in file:
+                commit, commit_time = parse_record(line.rstrip("\n"))
+                self.commits[commit.hash] = (commit, commit_time)  # Повторы после сбоя схлопываются
+        self.reindex()
+
+    def reindex(self):
+        entries = sorted((commit_time, hash_) for hash_, (_, commit_time) in self.commits.items())
+        self.times = [commit_time for commit_time, _ in entries]
+        self.order = [hash_ for _, hash_ in entries]
+
+    def update(self):
+        # Дочитывает коммиты после сохранённого HEAD, возвращает их число
+        head = git_output(self.repo_path, "rev-parse", "HEAD").strip()
+        if head == self.tip:
+            return 0
+        revision = head
+        if self.tip is not None:
+            is_ancestor = subprocess.run(["git", "merge-base", "--is-ancestor", self.tip, head],
+                                         capture_output=True, cwd=self.repo_path).returncode == 0
+            if is_ancestor:
+                revision = f"{self.tip}..{head}"
+            else:  # История переписана: кэш собирается заново
+                self.commits.clear()
+                self.log_path.unlink(missing_ok=True)
+        added = 0
+        with open(self.log_path, "a", encoding="utf-8") as file:
+            for line in iter_log(self.repo_path, revision):
+                commit, commit_time = parse_record(line)
+                if commit.hash not in self.commits:
+                    self.commits[commit.hash] = (commit, commit_time)
+                    file.write(line + "\n")
+                    added += 1
+        temp_tip = self.tip_path.with_suffix(".tmp")
+        temp_tip.write_text(head)
+        os.replace(temp_tip, self.tip_path)  # HEAD сохраняется только после записи коммитов
+        self.tip = head
+        self.reindex()
+        return added
+
+    def query(self, before_date):
+        # Коммиты с датой коммиттера не позже границы git log --before, новые первыми
+        end = bisect.bisect_right(self.times, before_timestamp(before_date))
+        for hash_ in reversed(self.order[:end]):
+            yield self.commits[hash_][0]
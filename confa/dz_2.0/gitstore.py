@@ -0,0 +1,259 @@
+import datetime
+import functools
+import heapq
+import mmap
+import os
+import struct
+import zlib
+from pathlib import Path
+
+# Типы объектов в pack-файле
+OBJ_COMMIT, OBJ_TREE, OBJ_BLOB, OBJ_TAG, OBJ_OFS_DELTA, OBJ_REF_DELTA = 1, 2, 3, 4, 6, 7
+TYPE_NAMES = {OBJ_COMMIT: b"commit", OBJ_TREE: b"tree", OBJ_BLOB: b"blob", OBJ_TAG: b"tag"}
+BASE_CACHE_SIZE = 256  # Сколько раскрытых базовых объектов дельт держать в памяти
+
+class Commit:
+    __slots__ = ("hash", "parents", "author", "date")
+
+    def __init__(self, hash_, parents, author, date):
+        self.hash = hash_
+        self.parents = parents
+        self.author = author
+        self.date = date
+
+class Pack:
+    # Пара .pack/.idx (индекс версии 2), оба файла отображены в память
+    def __init__(self, idx_path):
+        self.idx = self._map(idx_path)
+        self.pack = self._map(idx_path.with_suffix(".pack"))
+        if self.idx[:4] != b"\xfftOc" or struct.unpack_from(">I", self.idx, 4)[0] != 2:
+            raise ValueError(f"Unsupported pack index: {idx_path}")
+        self.fanout = struct.unpack_from(">256I", self.idx, 8)
+        self.count = self.fanout[-1]
+        self.names_offset = 8 + 256 * 4
+        self.offsets_offset = self.names_offset + self.count * 24  # Имена (20 байт) и CRC (4 байта)
+        self.large_offset = self.offsets_offset + self.count * 4
+
+    @staticmethod
+    def _map(path):
+        with open(path, "rb") as file:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def find(self, sha):
+        # Двоичный поиск 20-байтового имени в диапазоне, заданном таблицей fanout
+        low = self.fanout[sha[0] - 1] if sha[0] else 0
+        high = self.fanout[sha[0]]
+        while low < high:
+            middle = (low + high) // 2
+            start = self.names_offset + middle * 20
+            name = self.idx[start:start + 20]
+            if name < sha:
+                low = middle + 1
+            elif name > sha:
+                high = middle
+            else:
+                offset = struct.unpack_from(">I", self.idx, self.offsets_offset + middle * 4)[0]
+                if offset & 0x80000000:  # Смещение больше 2 ГБ лежит в отдельной таблице
+                    offset = struct.unpack_from(">Q", self.idx, self.large_offset + (offset & 0x7fffffff) * 8)[0]
+                return offset
+        return None
+
+    def header(self, offset):
+        # Тип и размер объекта: 3 бита типа и размер кодом переменной длины
+        byte = self.pack[offset]
+        obj_type = (byte >> 4) & 7
+        size = byte & 15
+        shift = 4
+        offset += 1
+        while byte & 0x80:
+            byte = self.pack[offset]
+            size |= (byte & 0x7f) << shift
+            shift += 7
+            offset += 1
+        return obj_type, size, offset
+
+    def inflate(self, offset, size):
+        decompressor = zlib.decompressobj()
+        parts = []
+        chunk = max(size, 64) + 64
+        while not decompressor.eof:
+            data = self.pack[offset:offset + chunk]
+            if not data:
+                break
+            parts.append(decompressor.decompress(data))
+            offset += chunk
+        return b"".join(parts)
+
+def apply_delta(base, delta):
+    # Формат git-дельты: размеры исходника и результата, затем команды копирования и вставки
+    def varint(position):
+        value = shift = 0
+        while True:
+            byte = delta[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return value, position
+
+    _, position = varint(0)
+    result_size, position = varint(position)
+    result = bytearray()
+    while position < len(delta):
+        opcode = delta[position]
+        position += 1
+        if opcode & 0x80:  # Копирование куска из базового объекта
+            copy_offset = copy_size = 0
+            for bit in range(4):
+                if opcode & (1 << bit):
+                    copy_offset |= delta[position] << (8 * bit)
+                    position += 1
+            for bit in range(3):
+                if opcode & (1 << (4 + bit)):
+                    copy_size |= delta[position] << (8 * bit)
+                    position += 1
+            result += base[copy_offset:copy_offset + (copy_size or 0x10000)]
+        elif opcode:  # Вставка opcode байт из самой дельты
+            result += delta[position:position + opcode]
+            position += opcode
+        else:
+            raise ValueError("Invalid delta opcode 0")
+    if len(result) != result_size:
+        raise ValueError("Delta result size mismatch")
+    return bytes(result)
+
+class GitObjectStore:
+    # Чтение объектов прямо из .git/objects: отдельные zlib-объекты и pack-файлы с дельтами
+    def __init__(self, repo_path):
+        git_dir = Path(repo_path)
+        if (git_dir / ".git").is_dir():
+            git_dir = git_dir / ".git"
+        elif (git_dir / ".git").is_file():  # Рабочее дерево git worktree или подмодуль
+            git_dir = (git_dir / (git_dir / ".git").read_text().split("gitdir:", 1)[1].strip()).resolve()
+        self.git_dir = git_dir
+        self.objects_dir = git_dir / "objects"
+        self.packs = [Pack(path) for path in sorted((self.objects_dir / "pack").glob("*.idx"))]
+        self.base_cache = {}  # (номер pack, смещение) -> (тип, данные)
+
+    def read(self, sha_hex):
+        # (тип, данные) объекта; тип - b"commit", b"tree", b"blob" или b"tag"
+        # Как и git, сначала ищем в pack-файлах: там обычно лежит почти вся история
+        sha = bytes.fromhex(sha_hex)
+        for pack_num, pack in enumerate(self.packs):
+            offset = pack.find(sha)
+            if offset is not None:
+                obj_type, data = self._read_packed(pack_num, offset)
+                return TYPE_NAMES[obj_type], data
+        try:
+            with open(os.path.join(self.objects_dir, sha_hex[:2], sha_hex[2:]), "rb") as file:
+                raw = zlib.decompress(file.read())
+        except FileNotFoundError:
+            raise KeyError(sha_hex) from None
+        header, _, data = raw.partition(b"\0")
+        return header.split(b" ")[0], data
+
+    def _read_packed(self, pack_num, offset):
+        cached = self.base_cache.get((pack_num, offset))
+        if cached is not None:
+            return cached
+        pack = self.packs[pack_num]
+        obj_type, size, position = pack.header(offset)
+        if obj_type == OBJ_OFS_DELTA:
+            # Смещение базы назад от начала объекта, своя кодировка переменной длины
+            byte = pack.pack[position]
+            position += 1
+            base_distance = byte & 0x7f
+            while byte & 0x80:
+                byte = pack.pack[position]
+                position += 1
+                base_distance = ((base_distance + 1) << 7) | (byte & 0x7f)
+            obj_type, base = self._read_packed(pack_num, offset - base_distance)
+            result = obj_type, apply_delta(base, pack.inflate(position, size))
+        elif obj_type == OBJ_REF_DELTA:
+            base_type, base = self.read(pack.pack[position:position + 20].hex())
+            obj_type = {name: num for num, name in TYPE_NAMES.items()}[base_type]
+            result = obj_type, apply_delta(base, pack.inflate(position + 20, size))
+        else:
+            result = obj_type, pack.inflate(position, size)
+        if len(self.base_cache) >= BASE_CACHE_SIZE:
+            self.base_cache.pop(next(iter(self.base_cache)))
+        self.base_cache[(pack_num, offset)] = result
+        return result
+
+    def resolve_ref(self, name):
+        # SHA коммита по имени ссылки: HEAD, refs/heads/..., с учётом packed-refs
+        for _ in range(10):  # Защита от зацикленных символических ссылок
+            ref_file = self.git_dir / name
+            if ref_file.is_file():
+                value = ref_file.read_text().strip()
+                if value.startswith("ref: "):
+                    name = value[5:]
+                    continue
+                return value
+            return self.packed_refs().get(name)
+        return None
+
+    def packed_refs(self):
+        refs = {}
+        packed = self.git_dir / "packed-refs"
+        if packed.is_file():
+            for line in packed.read_text().splitlines():
+                if line and not line.startswith(("#", "^")):
+                    sha, name = line.split(" ", 1)
+                    refs[name] = sha
+        return refs
+
+def parse_commit(sha_hex, data):
+    # Родители, имя автора, дата автора в формате --date=iso и время коммиттера
+    parents = []
+    author = date = ""
+    commit_time = 0
+    for line in data.split(b"\n"):
+        if not line:
+            break
+        key, _, value = line.partition(b" ")
+        if key == b"parent":
+            parents.append(value.decode())
+        elif key in (b"author", b"committer"):
+            person, _, when = value.decode("utf-8", errors="replace").rpartition("> ")
+            timestamp, tz = when.split()
+            if key == b"author":
+                author = person.rsplit(" <", 1)[0]
+                date = format_iso(int(timestamp), tz)
+            else:
+                commit_time = int(timestamp)
+    return Commit(sha_hex, tuple(parents), author, date), commit_time
+
+@functools.lru_cache(maxsize=None)
+def parse_tz(tz):
+    minutes = int(tz[1:3]) * 60 + int(tz[3:5])
+    return datetime.timezone(datetime.timedelta(minutes=-minutes if tz[0] == "-" else minutes))
+
+def format_iso(timestamp, tz):
+    # Как git log --date=iso: "2024-06-01 12:00:00 +0300"
+    moment = datetime.datetime.fromtimestamp(timestamp, parse_tz(tz))
+    return f"{moment:%Y-%m-%d %H:%M:%S} {tz}"
+
+def before_timestamp(before_date):
+    # Граница git log --before=YYYY-MM-DD: git берёт эту дату в текущее время суток (локальное время)
+    date = datetime.datetime.strptime(before_date, "%Y-%m-%d").date()
+    return int(datetime.datetime.combine(date, datetime.datetime.now().time()).timestamp())
+
+def walk_commits(repo_path, before_date, store=None):
+    # Обход коммитов от HEAD по родителям, новые первыми, как git log.
+    # Выдаются коммиты с датой коммиттера не позже границы before_timestamp(before_date)
+    store = store or GitObjectStore(repo_path)
+    before = before_timestamp(before_date)
+    sha = store.resolve_ref("HEAD")
+    commit, commit_time = parse_commit(sha, store.read(sha)[1])
+    queue = [(-commit_time, 0, commit)]
+    seen = {sha}
+    while queue:
+        negative_time, _, commit = heapq.heappop(queue)
+        if -negative_time <= before:
+            yield commit
+        for parent in commit.parents:
+            if parent not in seen:
+                seen.add(parent)
+                parent_commit, parent_time = parse_commit(parent, store.read(parent)[1])
+                heapq.heappush(queue, (-parent_time, len(seen), parent_commit))
@@ -0,0 +1,157 @@
+import heapq
+from array import array
+from collections import Counter, deque
+
+from gitstore import Commit
+
+class CommitIndex:
+    # Граф коммитов в виде CSR-массивов: у коммита с номером i родители лежат в
+    # parent_ids[parent_offsets[i]:parent_offsets[i + 1]], потомки - так же в child_ids.
+    # generation - номер поколения: 1 у корней, у остальных на 1 больше, чем у старшего родителя
+    def __init__(self, commits):
+        commits = list(commits)
+        self.hashes = [commit.hash for commit in commits]
+        self.authors = [commit.author for commit in commits]
+        self.days = [commit.date[:10] for commit in commits]
+        self.ids = {hash_: number for number, hash_ in enumerate(self.hashes)}
+        count = len(commits)
+
+        # Рёбра к коммитам вне выборки отбрасываются
+        self.parent_offsets = array("q", [0])
+        self.parent_ids = array("q")
+        child_counts = array("q", bytes(8 * count))
+        for commit in commits:
+            for parent in commit.parents:
+                parent_id = self.ids.get(parent)
+                if parent_id is not None:
+                    self.parent_ids.append(parent_id)
+                    child_counts[parent_id] += 1
+            self.parent_offsets.append(len(self.parent_ids))
+
+        self.child_offsets = array("q", [0]) * (count + 1)
+        for number in range(count):
+            self.child_offsets[number + 1] = self.child_offsets[number] + child_counts[number]
+        self.child_ids = array("q", bytes(8 * len(self.parent_ids)))
+        fill = array("q", self.child_offsets[:count])
+        for number in range(count):
+            for parent_id in self.parents(number):
+                self.child_ids[fill[parent_id]] = number
+                fill[parent_id] += 1
+
+        # Поколения в порядке от корней к потомкам (алгоритм Кана)
+        self.generation = array("q", bytes(8 * count))
+        self.best_parent = array("q", [-1]) * count  # Родитель на самом длинном пути от корня
+        remaining = array("q", (self.parent_offsets[i + 1] - self.parent_offsets[i] for i in range(count)))
+        queue = deque(number for number in range(count) if not remaining[number])
+        while queue:
+            number = queue.popleft()
+            self.generation[number] += 1
+            for child in self.children(number):
+                if self.generation[number] > self.generation[child]:
+                    self.generation[child] = self.generation[number]
+                    self.best_parent[child] = number
+                remaining[child] -= 1
+                if not remaining[child]:
+                    queue.append(child)
+
+    @classmethod
+    def from_commit_data(cls, commits):
+        # Из словаря parse_commit_data: hash -> {"parents", "author", "date"}
+        return cls(Commit(hash_, tuple(details["parents"]), details["author"], details["date"])
+                   for hash_, details in commits.items())
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def parents(self, number):
+        return self.parent_ids[self.parent_offsets[number]:self.parent_offsets[number + 1]]
+
+    def children(self, number):
+        return self.child_ids[self.child_offsets[number]:self.child_offsets[number + 1]]
+
+    def id_of(self, ref):
+        # Номер коммита по полному хешу или однозначному префиксу
+        if ref in self.ids:
+            return self.ids[ref]
+        matches = [number for number, hash_ in enumerate(self.hashes) if hash_.startswith(ref)]
+        if len(matches) != 1:
+            raise KeyError(f"Commit '{ref}' is {'ambiguous' if matches else 'not found'}.")
+        return matches[0]
+
+    def walk(self, start, neighbours, keep=None):
+        # Обход в ширину без самой start; keep отсекает ветви обхода
+        seen = bytearray(len(self.hashes))
+        seen[start] = 1
+        queue = deque([start])
+        while queue:
+            for number in neighbours(queue.popleft()):
+                if not seen[number] and (keep is None or keep(number)):
+                    seen[number] = 1
+                    queue.append(number)
+                    yield number
+
+    def ancestors(self, ref):
+        return [self.hashes[number] for number in self.walk(self.id_of(ref), self.parents)]
+
+    def descendants(self, ref):
+        return [self.hashes[number] for number in self.walk(self.id_of(ref), self.children)]
+
+    def is_ancestor(self, ancestor_ref, descendant_ref):
+        # У предка поколение строго меньше, поэтому коммиты с поколением не больше,
+        # чем у искомого, дальше не обходятся
+        ancestor, descendant = self.id_of(ancestor_ref), self.id_of(descendant_ref)
+        if ancestor == descendant:
+            return True
+        floor = self.generation[ancestor]
+        if floor >= self.generation[descendant]:
+            return False
+        keep = lambda number: self.generation[number] >= floor
+        return any(number == ancestor for number in self.walk(descendant, self.parents, keep))
+
+    def merge_base(self, first_ref, second_ref):
+        # Лучшие общие предки, как git merge-base --all: коммиты обходятся от больших поколений
+        # к меньшим, так что к моменту обработки коммита все его потомки в обходе уже учтены
+        first, second = self.id_of(first_ref), self.id_of(second_ref)
+        from_first, from_second, stale = 1, 2, 4
+        flags = {first: from_first}
+        flags[second] = flags.get(second, 0) | from_second
+        queue = [(-self.generation[number], number) for number in flags]
+        heapq.heapify(queue)
+        active = len(queue)  # Коммиты в очереди без метки stale; когда их нет, обход закончен
+        result = []
+        while active:
+            _, number = heapq.heappop(queue)
+            number_flags = flags[number]
+            if not number_flags & stale:
+                active -= 1
+                if number_flags & (from_first | from_second) == from_first | from_second:
+                    result.append(self.hashes[number])
+                    number_flags |= stale  # Предки общего предка уже не лучшие
+            for parent in self.parents(number):
+                parent_flags = flags.get(parent)
+                if parent_flags is None:
+                    flags[parent] = number_flags
+                    heapq.heappush(queue, (-self.generation[parent], parent))
+                    active += not number_flags & stale
+                else:
+                    flags[parent] = parent_flags | number_flags
+                    if number_flags & stale and not parent_flags & stale:
+                        active -= 1
+        return result
+
+    def longest_path(self):
+        # Самая длинная цепочка от корня до коммита с наибольшим поколением
+        if not self.hashes:
+            return []
+        number = max(range(len(self.hashes)), key=self.generation.__getitem__)
+        path = []
+        while number != -1:
+            path.append(self.hashes[number])
+            number = self.best_parent[number]
+        return path[::-1]
+
+    def author_counts(self):
+        return Counter(self.authors).most_common()
+
+    def commits_per_day(self):
+        return sorted(Counter(self.days).items())
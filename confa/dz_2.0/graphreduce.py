@@ -0,0 +1,103 @@
+class Node:
+    # Узел упрощённого графа: коммит или цепочка из count коммитов,
+    # hash, author и date берутся у самого нового коммита цепочки
+    __slots__ = ("hash", "parents", "author", "date", "count")
+
+    def __init__(self, commit, parents, count=1):
+        self.hash = commit.hash
+        self.parents = parents
+        self.author = commit.author
+        self.date = commit.date
+        self.count = count
+
+def count_edges(commits):
+    return sum(len(commit.parents) for commit in commits)
+
+def prune(commits):
+    # Рёбра к коммитам, не попавшим в выборку, отбрасываются
+    hashes = {commit.hash for commit in commits}
+    return [commit if all(parent in hashes for parent in commit.parents) else
+            Node(commit, tuple(parent for parent in commit.parents if parent in hashes), getattr(commit, "count", 1))
+            for commit in commits]
+
+def since_window(commits, since):
+    # Коммиты с датой автора не раньше since (YYYY-MM-DD)
+    return prune([commit for commit in commits if commit.date[:10] >= since])
+
+def first_parent_window(commits):
+    # Только первые родители, начиная от коммитов без потомков (вершин веток)
+    by_hash = {commit.hash: commit for commit in commits}
+    has_children = {parent for commit in commits for parent in commit.parents}
+    kept = set()
+    for commit in commits:
+        if commit.hash in has_children:
+            continue
+        while commit is not None and commit.hash not in kept:
+            kept.add(commit.hash)
+            commit = by_hash.get(commit.parents[0]) if commit.parents else None
+    return [Node(commit, commit.parents[:1] if commit.parents and commit.parents[0] in kept else (),
+                 getattr(commit, "count", 1))
+            for commit in commits if commit.hash in kept]
+
+def chain_links(commits):
+    # Звенья линейных цепочек: ровно один родитель и ровно один потомок в выборке.
+    # Возвращает словарь родителей и для каждого звена - его единственного потомка
+    parents = {commit.hash: commit.parents for commit in commits}
+    child_count = {}
+    child = {}
+    for commit in commits:
+        for parent in commit.parents:
+            child_count[parent] = child_count.get(parent, 0) + 1
+            child[parent] = commit.hash
+    links = {hash_: child[hash_] for hash_, commit_parents in parents.items()
+             if len(commit_parents) == 1 and child_count.get(hash_) == 1}
+    return parents, links
+
+def collapse_chains(commits):
+    # Каждая цепочка звеньев заменяется одним узлом с числом коммитов
+    parents, links = chain_links(commits)
+    counts = {commit.hash: getattr(commit, "count", 1) for commit in commits}
+    result = []
+    for commit in commits:
+        if commit.hash not in links:
+            result.append(commit)
+        elif links[commit.hash] not in links:  # Самый новый коммит цепочки
+            tail = commit.hash
+            count = counts[tail]
+            while parents[tail][0] in links:
+                tail = parents[tail][0]
+                count += counts[tail]
+            result.append(Node(commit, parents[tail], count))
+    return result
+
+def key_commits(commits):
+    # Остаются слияния, точки ветвления, вершины веток и корни,
+    # рёбра ведут к ближайшему оставшемуся предку
+    parents, links = chain_links(commits)
+    result = []
+    for commit in commits:
+        if commit.hash in links:
+            continue
+        new_parents = []
+        for parent in commit.parents:
+            while parent in links:
+                parent = parents[parent][0]
+            new_parents.append(parent)
+        result.append(Node(commit, tuple(new_parents), getattr(commit, "count", 1)))
+    return result
+
+def reduce_graph(commits, since=None, first_parent=False, collapse=False, key_only=False, max_nodes=None):
+    # Окно по дате и первым родителям, затем упрощения; при превышении max_nodes
+    # упрощения включаются по очереди, в конце остаются max_nodes самых новых узлов
+    nodes = list(commits)
+    if since:
+        nodes = since_window(nodes, since)
+    if first_parent:
+        nodes = first_parent_window(nodes)
+    if collapse or (max_nodes and len(nodes) > max_nodes):
+        nodes = collapse_chains(nodes)
+    if key_only or (max_nodes and len(nodes) > max_nodes):
+        nodes = key_commits(nodes)
+    if max_nodes and len(nodes) > max_nodes:
+        nodes = prune(nodes[:max_nodes])
+    return nodes
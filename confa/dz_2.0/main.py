@@ -2,18 +2,46 @@ import os
 import subprocess
 import argparse
 import datetime
+import sys
+import time
 from pathlib import Path
 
+from commitcache import DEFAULT_CACHE_DIR, CommitCache
+from gitstore import Commit, walk_commits
+from graphreduce import count_edges, reduce_graph
+from svgrender import iter_dot, iter_svg, write_lines
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # Общий модуль instrument.py в confa
+from instrument import add_profile_arguments, metrics, profiling
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Visualize git commit dependency graph.")
-    parser.add_argument("--plantuml-path", required=True, help="Path to PlantUML jar file.")
+    parser.add_argument("--plantuml-path", help="Path to PlantUML jar file (required for the plantuml renderer).")
     parser.add_argument("--repo-path", required=True, help="Path to the git repository.")
-    parser.add_argument("--output-path", required=True, help="Path to save the dependency graph image (PNG format).")
+    parser.add_argument("--output-path", required=True,
+                        help="Path to save the dependency graph image (PNG for plantuml, or SVG/DOT file).")
     parser.add_argument("--before-date", required=True, help="Include only commits before this date (YYYY-MM-DD).")
+    parser.add_argument("--reader", choices=("git", "native", "cache"), default="git",
+                        help="Read history via 'git log', directly from the .git object store, "
+                             "or from an on-disk cache updated with only the new commits.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory of the commit cache.")
+    parser.add_argument("--since", help="Include only commits authored on or after this date (YYYY-MM-DD).")
+    parser.add_argument("--first-parent", action="store_true", help="Follow only the first parent of merges.")
+    parser.add_argument("--collapse-chains", action="store_true",
+                        help="Draw each linear chain of commits as one node with a commit count.")
+    parser.add_argument("--key-commits", action="store_true",
+                        help="Keep only merges, branch points, branch tips and roots.")
+    parser.add_argument("--max-nodes", type=int,
+                        help="Node budget: collapse chains, then keep key commits, then keep the newest nodes.")
+    parser.add_argument("--renderer", choices=("plantuml", "svg", "dot"), default="plantuml",
+                        help="Render with PlantUML, write SVG with the built-in layered layout, "
+                             "or write Graphviz DOT.")
+    add_profile_arguments(parser)
     return parser.parse_args()
 
 def validate_paths(plantuml_path, repo_path, output_path):
-    if not Path(plantuml_path).is_file():
+    # plantuml_path равен None, если PlantUML не нужен (встроенные SVG и DOT)
+    if plantuml_path is not None and not Path(plantuml_path).is_file():
         raise FileNotFoundError(f"PlantUML path '{plantuml_path}' does not exist or is not a file.")
     if not Path(repo_path).is_dir():
         raise NotADirectoryError(f"Repository path '{repo_path}' does not exist or is not a directory.")
@@ -21,12 +49,61 @@ def validate_paths(plantuml_path, repo_path, output_path):
     if not output_dir.exists():
         os.makedirs(output_dir)
 
+def git_log_command(before_date):
+    return ["git", "log", f"--before={before_date}", "--pretty=format:%H|%P|%an|%ad", "--date=iso"]
+
 def fetch_commit_data(repo_path, before_date):
     os.chdir(repo_path)
-    command = ["git", "log", f"--before={before_date}", "--pretty=format:%H|%P|%an|%ad", "--date=iso"]
+    command = git_log_command(before_date)
     result = subprocess.run(command, capture_output=True, text=True, check=True)
     return result.stdout.splitlines()
 
+def iter_commit_lines(repo_path, before_date):
+    # Потоковое чтение git log: строки отдаются по мере вывода, весь лог в памяти не хранится
+    command = git_log_command(before_date)
+    with subprocess.Popen(command, stdout=subprocess.PIPE, text=True, cwd=repo_path) as process:
+        for line in process.stdout:
+            yield line.rstrip("\n")
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+def iter_commits(commit_lines):
+    for line in commit_lines:
+        hash_, parents, author, date = line.split('|')
+        yield Commit(hash_, tuple(parents.split()), author, date)
+
+def read_commits(repo_path, before_date, reader="git", cache_dir=DEFAULT_CACHE_DIR):
+    # Записи коммитов из git log, напрямую из .git/objects, без запуска git,
+    # или из кэша, в который дочитываются только новые коммиты
+    if reader == "native":
+        return walk_commits(repo_path, before_date)
+    if reader == "cache":
+        cache = CommitCache(repo_path, cache_dir)
+        cache.update()
+        return cache.query(before_date)
+    return iter_commits(iter_commit_lines(repo_path, before_date))
+
+def read_commits_by_phase(repo_path, before_date, reader="git", cache_dir=DEFAULT_CACHE_DIR):
+    # Как read_commits, но история читается в список, чтобы время фаз считалось отдельно:
+    # fetch - получение записей из git, parse - разбор в Commit.
+    # Родной читатель разбирает объекты по ходу чтения, у него есть только fetch
+    if reader == "native":
+        with metrics.phase("fetch"):
+            commits = list(walk_commits(repo_path, before_date))
+    elif reader == "cache":
+        cache = CommitCache(repo_path, cache_dir)
+        with metrics.phase("fetch"):
+            cache.update()
+        with metrics.phase("parse"):
+            commits = list(cache.query(before_date))
+    else:
+        with metrics.phase("fetch"):
+            lines = list(iter_commit_lines(repo_path, before_date))
+        with metrics.phase("parse"):
+            commits = list(iter_commits(lines))
+    metrics.count("commits", len(commits))
+    return commits
+
 def parse_commit_data(commit_lines):
     commits = {}
     for line in commit_lines:
@@ -38,17 +115,38 @@ def parse_commit_data(commit_lines):
         }
     return commits
 
+def iter_plantuml(commits):
+    yield "@startuml"  # Начало диаграммы
+    for commit in commits:
+        count = getattr(commit, "count", 1)  # Свёрнутая цепочка коммитов
+        suffix = f"\\n({count} commits)" if count > 1 else ""
+        yield f"  {commit.hash} : {commit.date}\\n{commit.author}{suffix}"  # Узел с меткой
+        for parent in commit.parents:
+            yield f"  {parent} --> {commit.hash}"  # Стрелка из родителя в текущий коммит
+    yield "@enduml"  # Конец диаграммы
+
+def iter_graph(commits, renderer):
+    # Строки выходного файла: SVG, DOT или текст диаграммы PlantUML
+    if renderer == "svg":
+        return iter_svg(list(commits))  # Раскладке нужен весь граф
+    if renderer == "dot":
+        return iter_dot(commits)
+    return iter_plantuml(commits)
+
 def generate_plantuml(commits):
-    lines = ["@startuml"]  # Начало диаграммы
-    for hash_, details in commits.items():
-        label = f"{details['date']}\\n{details['author']}"
-        lines.append(f"  {hash_} : {label}")  # Узел с меткой
-        for parent in details["parents"]:
-            lines.append(f"  {parent} --> {hash_}")  # Стрелка из родителя в текущий коммит
-    lines.append("@enduml")  # Конец диаграммы
-    return "\n".join(lines)
+    records = (Commit(hash_, details["parents"], details["author"], details["date"])
+               for hash_, details in commits.items())
+    return "\n".join(iter_plantuml(records))
 
+def write_plantuml(plantuml_lines, puml_path):
+    # Строки диаграммы пишутся в файл по одной, без сборки общего текста
+    with open(puml_path, "w") as file:
+        for line in plantuml_lines:
+            file.write(line)
+            file.write("\n")
 
+def render_puml(puml_path, plantuml_path, output_path):
+    subprocess.run(["java", "-jar", plantuml_path, puml_path, "-o", str(Path(output_path).parent)], check=True)
 
 def create_graph_image(plantuml_text, plantuml_path, output_path):
     temp_puml_file = f"{output_path}.puml"
@@ -56,26 +154,61 @@ def create_graph_image(plantuml_text, plantuml_path, output_path):
         file.write(plantuml_text)
 
     try:
-        subprocess.run(["java", "-jar", plantuml_path, temp_puml_file, "-o", str(Path(output_path).parent)], check=True)
+        render_puml(temp_puml_file, plantuml_path, output_path)
     finally:
         if Path(temp_puml_file).exists():
             os.remove(temp_puml_file)
 
+def draw_graph(args):
+    # git log -> записи коммитов -> строки диаграммы -> .puml идут одним потоком,
+    # для упрощения графа записи собираются в список. С --profile каждая фаза
+    # (fetch, parse, reduce, generate, render) выполняется целиком до следующей
+    if metrics.enabled:
+        commits = read_commits_by_phase(args.repo_path, args.before_date, args.reader, args.cache_dir)
+    else:
+        commits = read_commits(args.repo_path, args.before_date, args.reader, args.cache_dir)
+    if args.since or args.first_parent or args.collapse_chains or args.key_commits or args.max_nodes:
+        commits = list(commits)
+        with metrics.phase("reduce"):
+            nodes = reduce_graph(commits, args.since, args.first_parent, args.collapse_chains,
+                                 args.key_commits, args.max_nodes)
+        print(f"Nodes: {len(commits)} -> {len(nodes)}, edges: {count_edges(commits)} -> {count_edges(nodes)}")
+        commits = nodes
+    start = time.perf_counter()
+    lines = iter_graph(commits, args.renderer)
+    if metrics.enabled:
+        with metrics.phase("generate"):
+            lines = list(lines)
+        metrics.count("lines", len(lines))
+    if args.renderer == "plantuml":
+        temp_puml_file = f"{args.output_path}.puml"
+        with metrics.phase("render"):
+            try:
+                write_plantuml(lines, temp_puml_file)  # Здесь же выполняется git log: ошибка тоже удаляет .puml
+                start = time.perf_counter()
+                render_puml(temp_puml_file, args.plantuml_path, args.output_path)
+            finally:
+                if Path(temp_puml_file).exists():
+                    os.remove(temp_puml_file)
+    else:
+        with metrics.phase("render"):
+            write_lines(lines, args.output_path)
+    print(f"Render time: {time.perf_counter() - start:.2f} s")
+    print(f"Dependency graph successfully saved to {args.output_path}.")
+
 def main():
     args = parse_args()
-    validate_paths(args.plantuml_path, args.repo_path, args.output_path)
+    if args.renderer == "plantuml" and not args.plantuml_path:
+        raise ValueError("--plantuml-path is required for the plantuml renderer.")
+    validate_paths(args.plantuml_path if args.renderer == "plantuml" else None, args.repo_path, args.output_path)
 
     try:
         datetime.datetime.strptime(args.before_date, "%Y-%m-%d")
     except ValueError:
         raise ValueError("Invalid date format. Use YYYY-MM-DD.")
 
-    commit_lines = fetch_commit_data(args.repo_path, args.before_date)
-    commits = parse_commit_data(commit_lines)
-    plantuml_text = generate_plantuml(commits)
-    create_graph_image(plantuml_text, args.plantuml_path, args.output_path)
-
-    print(f"Dependency graph successfully saved to {args.output_path}.")
+    with profiling("grapher", args.profile, args.profile_output):
+        draw_graph(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import queue
+import subprocess
+import threading
+
+DELIMITER = b"___PLANTUML_DIAGRAM_END___"  # Печатается PlantUML после каждого изображения
+
+def pipe_command(plantuml_path, image_format="png"):
+    # PlantUML в режиме -pipe читает диаграммы из stdin и пишет изображения в stdout
+    return ["java", "-jar", plantuml_path, "-pipe", f"-t{image_format}", "-pipedelimitor", DELIMITER.decode()]
+
+class PlantUmlRenderer:
+    # Один запущенный процесс PlantUML: JVM стартует один раз на много диаграмм
+    def __init__(self, command):
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL)
+        self.buffer = b""
+
+    def render(self, plantuml_lines):
+        # Строки диаграммы от @startuml до @enduml -> байты изображения
+        stdin = self.process.stdin
+        for line in plantuml_lines:
+            stdin.write(line.encode("utf-8"))
+            stdin.write(b"\n")
+        stdin.flush()
+        while True:
+            end = self.buffer.find(DELIMITER)
+            if end >= 0:
+                line_end = self.buffer.find(b"\n", end)
+                if line_end >= 0:
+                    image = self.buffer[:end]
+                    self.buffer = self.buffer[line_end + 1:]
+                    return image
+            chunk = self.process.stdout.read1(65536)
+            if not chunk:
+                raise RuntimeError(f"PlantUML renderer exited with code {self.process.wait()}")
+            self.buffer += chunk
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:  # Процесс уже завершился, не прочитав диаграмму
+            pass
+        if self.process.poll() is None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process.stdout.close()
+
+class RendererPool:
+    # Несколько постоянных рендереров; поток берёт свободный и возвращает после отрисовки.
+    # Если упавший рендерер не удаётся перезапустить, пул уменьшается на один процесс
+    def __init__(self, command, size=2):
+        self.command = command
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(PlantUmlRenderer(command))
+        self.size = size
+        self.lock = threading.Lock()
+
+    def render(self, plantuml_lines):
+        renderer = self.idle.get()
+        if renderer is None:  # Рендереров не осталось: метка остаётся для остальных потоков
+            self.idle.put(None)
+            raise RuntimeError("No PlantUML renderers left in the pool")
+        try:
+            image = renderer.render(plantuml_lines)
+        except Exception:
+            renderer.close()  # Процесс в неизвестном состоянии: заменяем новым
+            try:
+                replacement = PlantUmlRenderer(self.command)
+            except Exception:
+                self.shrink()
+                raise
+            self.idle.put(replacement)
+            raise
+        self.idle.put(renderer)
+        return image
+
+    def shrink(self):
+        with self.lock:
+            self.size -= 1
+            if not self.size:
+                self.idle.put(None)
+
+    def close(self):
+        for _ in range(self.size):
+            self.idle.get().close()
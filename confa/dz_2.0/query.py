@@ -0,0 +1,82 @@
+import argparse
+import json
+import sys
+import time
+
+from commitcache import DEFAULT_CACHE_DIR
+from graphindex import CommitIndex
+from main import read_commits
+
+def run_queries(index, args):
+    # Результаты запрошенных вычислений: имя -> значение, пригодное для JSON
+    results = {"commits": len(index), "edges": len(index.parent_ids)}
+    if args.is_ancestor:
+        results["is_ancestor"] = index.is_ancestor(*args.is_ancestor)
+    if args.ancestors:
+        results["ancestors"] = index.ancestors(args.ancestors)
+    if args.descendants:
+        results["descendants"] = index.descendants(args.descendants)
+    if args.merge_base:
+        results["merge_base"] = index.merge_base(*args.merge_base)
+    if args.longest_path:
+        results["longest_path"] = index.longest_path()
+    if args.authors:
+        results["authors"] = dict(index.author_counts())
+    if args.per_day:
+        results["commits_per_day"] = dict(index.commits_per_day())
+    return results
+
+def print_results(results):
+    for name, value in results.items():
+        if isinstance(value, dict):
+            print(f"{name}:")
+            for key, count in value.items():
+                print(f"  {key}: {count}")
+        elif isinstance(value, list):
+            print(f"{name} ({len(value)}):")
+            for item in value:
+                print(f"  {item}")
+        else:
+            print(f"{name}: {value}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Answer queries about the commit graph of a git repository. "
+                                                 "COMMIT arguments are full hashes or unique hash prefixes; "
+                                                 "HEAD, branch and tag names are not accepted.")
+    parser.add_argument("--repo-path", required=True, help="Path to the git repository.")
+    parser.add_argument("--before-date", required=True, help="Include only commits before this date (YYYY-MM-DD).")
+    parser.add_argument("--reader", choices=("git", "native", "cache"), default="git",
+                        help="How to read the history, as in main.py.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory of the commit cache.")
+    parser.add_argument("--is-ancestor", nargs=2, metavar=("ANCESTOR", "COMMIT"),
+                        help="Check whether ANCESTOR is reachable from COMMIT by parent links.")
+    parser.add_argument("--ancestors", metavar="COMMIT", help="List all ancestors of COMMIT.")
+    parser.add_argument("--descendants", metavar="COMMIT", help="List all descendants of COMMIT.")
+    parser.add_argument("--merge-base", nargs=2, metavar=("COMMIT1", "COMMIT2"),
+                        help="Best common ancestors of two commits.")
+    parser.add_argument("--longest-path", action="store_true", help="Longest chain of commits from a root.")
+    parser.add_argument("--authors", action="store_true", help="Number of commits per author.")
+    parser.add_argument("--per-day", action="store_true", help="Number of commits per day.")
+    parser.add_argument("--json", help="Write the results to this JSON file instead of printing them.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    index = CommitIndex(read_commits(args.repo_path, args.before_date, args.reader, args.cache_dir))
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    try:
+        results = run_queries(index, args)
+    except KeyError as e:  # Неизвестный или неоднозначный хеш
+        sys.exit(f"Error: {e.args[0]}")
+    query_time = time.perf_counter() - start
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    else:
+        print_results(results)
+    print(f"Index: {build_time:.2f} s, queries: {query_time:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import heapq
+import os
+from xml.sax.saxutils import escape
+
+ROW_HEIGHT = 20  # Расстояние между строками (слоями) графа, px
+COLUMN_WIDTH = 16  # Расстояние между дорожками, px
+MARGIN = 20
+RADIUS = 4
+LABEL_WIDTH = 600  # Место под подписи справа от графа
+COLORS = ("#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#17becf")
+
+def topological_order(commits):
+    # Потомки раньше родителей; обход в глубину по первым родителям,
+    # чтобы ветка шла подряд и дорожки освобождались быстрее
+    by_hash = {commit.hash: commit for commit in commits}
+    pending = {}  # hash -> число ещё не выведенных потомков
+    for commit in commits:
+        for parent in commit.parents:
+            if parent in by_hash:
+                pending[parent] = pending.get(parent, 0) + 1
+    stack = [commit for commit in reversed(commits) if commit.hash not in pending]
+    order = []
+    while stack:
+        commit = stack.pop()
+        order.append(commit)
+        for parent in reversed(commit.parents):
+            if parent in pending:
+                pending[parent] -= 1
+                if not pending[parent]:
+                    stack.append(by_hash[parent])
+    return order
+
+def layout(commits):
+    # Послойная раскладка: слой (строка) - позиция в топологическом порядке,
+    # столбец - дорожка, занятая от потомка до ожидаемого родителя, как в git log --graph.
+    # Возвращает порядок коммитов, hash -> (столбец, строка) и ширину в дорожках
+    order = topological_order(commits)
+    positions = {}
+    expected = {}  # hash родителя -> дорожка, зарезервированная под него
+    free = []  # Освободившиеся дорожки, берётся самая левая
+    width = 0
+    known = {commit.hash for commit in order}
+    for row, commit in enumerate(order):
+        column = expected.pop(commit.hash, None)
+        if column is None:
+            column = heapq.heappop(free) if free else width
+        width = max(width, column + 1)
+        positions[commit.hash] = (column, row)
+        lane_kept = False
+        for parent in commit.parents:
+            if parent not in known or parent in expected:
+                continue
+            if not lane_kept:
+                expected[parent] = column
+                lane_kept = True
+            else:
+                new_column = heapq.heappop(free) if free else width
+                width = max(width, new_column + 1)
+                expected[parent] = new_column
+        if not lane_kept:
+            heapq.heappush(free, column)
+    return order, positions, width
+
+def edge_points(child, parent):
+    # Ребро спускается в дорожку родителя на следующей строке и идёт по ней вертикально
+    (child_column, child_row), (parent_column, parent_row) = child, parent
+    if child_column == parent_column or parent_row == child_row + 1:
+        return [child, parent]
+    return [child, (parent_column, child_row + 1), parent]
+
+def node_label(commit):
+    count = getattr(commit, "count", 1)  # Свёрнутая цепочка коммитов
+    suffix = f" ({count} commits)" if count > 1 else ""
+    return f"{commit.hash[:8]} {commit.date} {commit.author}{suffix}"
+
+def iter_svg(commits):
+    order, positions, width = layout(commits)
+    x = lambda column: MARGIN + column * COLUMN_WIDTH
+    y = lambda row: MARGIN + row * ROW_HEIGHT
+    label_x = x(width) + 10
+    yield (f'<svg xmlns="http://www.w3.org/2000/svg" width="{label_x + LABEL_WIDTH}" '
+           f'height="{y(len(order))}" font-family="monospace" font-size="12">')
+    yield '<g fill="none" stroke-width="2">'
+    for commit in order:
+        child = positions[commit.hash]
+        for parent in commit.parents:
+            if parent in positions:
+                points = " ".join(f"{x(column)},{y(row)}" for column, row in edge_points(child, positions[parent]))
+                color = COLORS[positions[parent][0] % len(COLORS)]
+                yield f'<polyline points="{points}" stroke="{color}"/>'
+    yield '</g>'
+    for commit in order:
+        column, row = positions[commit.hash]
+        label = escape(node_label(commit))
+        yield (f'<circle cx="{x(column)}" cy="{y(row)}" r="{RADIUS}" fill="{COLORS[column % len(COLORS)]}">'
+               f'<title>{escape(commit.hash)}</title></circle>')
+        yield f'<text x="{label_x}" y="{y(row) + 4}">{label}</text>'
+    yield '</svg>'
+
+def dot_quote(text):
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def iter_dot(commits):
+    # Описание графа для Graphviz; раскладку делает dot
+    yield "digraph commits {"
+    yield "  rankdir=BT;"
+    yield "  node [shape=box, fontname=monospace];"
+    for commit in commits:
+        yield f"  {dot_quote(commit.hash)} [label={dot_quote(node_label(commit))}];"
+        for parent in commit.parents:
+            yield f"  {dot_quote(parent)} -> {dot_quote(commit.hash)};"
+    yield "}"
+
+def write_lines(lines, path):
+    # Строки идут во временный файл рядом с path, который заменяет path только после записи всех строк:
+    # ошибка при чтении истории не оставляет обрезанный граф
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as file:
+            for line in lines:
+                file.write(line)
+                file.write("\n")
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def write_svg(commits, path):
+    write_lines(iter_svg(list(commits)), path)
+
+def write_dot(commits, path):
+    write_lines(iter_dot(commits), path)
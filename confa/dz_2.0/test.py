@@ -1,7 +1,14 @@
+import argparse
+import asyncio
+import datetime
+import json
 import unittest
 from unittest.mock import patch, MagicMock, mock_open
 import subprocess
 import os
+import shutil
+import sys
+import tempfile
 from pathlib import Path
 
 # Импортируем тестируемый модуль
@@ -10,8 +17,40 @@ from main import (
     fetch_commit_data,
     parse_commit_data,
     generate_plantuml,
-    create_graph_image
+    create_graph_image,
+    iter_commit_lines,
+    iter_commits,
+    iter_plantuml,
+    write_plantuml,
+    read_commits,
+    read_commits_by_phase,
+    draw_graph,
+    profiling
 )
+from gitstore import Commit, apply_delta, walk_commits
+from graphreduce import count_edges, reduce_graph
+from graphindex import CommitIndex
+from svgrender import iter_dot, iter_svg, layout
+from plantumlpipe import DELIMITER, PlantUmlRenderer, RendererPool
+from batch import read_manifest, run_batch, run_manifest
+from commitcache import CommitCache
+import query
+
+# Заменитель PlantUML -pipe: на каждую диаграмму отвечает "число строк:номер" и разделителем,
+# на строку "crash" завершается
+FAKE_PLANTUML = f"""
+import sys
+lines = count = 0
+for line in sys.stdin:
+    if line.strip() == "crash":
+        sys.exit(3)
+    lines += 1
+    if line.strip() == "@enduml":
+        count += 1
+        sys.stdout.buffer.write(f"{{lines}}:{{count}}".encode() + {DELIMITER!r} + b"\\n")
+        sys.stdout.flush()
+        lines = 0
+"""
 
 class TestGitCommitGraph(unittest.TestCase):
     @patch("pathlib.Path.is_file", return_value=True)  # Мокируем существование файла
@@ -82,6 +121,331 @@ class TestGitCommitGraph(unittest.TestCase):
         )
         self.assertEqual(plantuml_text.strip(), expected_text.strip())
 
+    @patch("subprocess.Popen")
+    def test_iter_commit_lines(self, mock_popen):
+        process = mock_popen.return_value.__enter__.return_value
+        process.stdout = iter(["hash1|parent1|author1|2024-06-01\n", "hash2||author2|2024-06-02"])
+        process.returncode = 0
+        result = list(iter_commit_lines("/fake/repo", "2024-06-01"))
+
+        self.assertEqual(result, ["hash1|parent1|author1|2024-06-01", "hash2||author2|2024-06-02"])
+        mock_popen.assert_called_with(
+            ["git", "log", "--before=2024-06-01", "--pretty=format:%H|%P|%an|%ad", "--date=iso"],
+            stdout=subprocess.PIPE,
+            text=True,
+            cwd="/fake/repo"
+        )
+
+        process.stdout = iter([])
+        process.returncode = 128
+        with self.assertRaises(subprocess.CalledProcessError):
+            list(iter_commit_lines("/fake/repo", "2024-06-01"))
+
+    def test_streaming_plantuml(self):
+        commit_lines = ["hash1|parent1 parent2|author1|2024-06-01", "hash2||author2|2024-06-02"]
+        commits = list(iter_commits(commit_lines))
+        self.assertEqual(commits[0].parents, ("parent1", "parent2"))
+        # Потоковый вывод совпадает с generate_plantuml
+        self.assertEqual("\n".join(iter_plantuml(commits)), generate_plantuml(parse_commit_data(commit_lines)))
+
+        with patch("builtins.open", mock_open()) as mock_file:
+            write_plantuml(iter_plantuml(commits), "graph.puml")
+        mock_file.assert_called_once_with("graph.puml", "w")
+        written = "".join(call.args[0] for call in mock_file().write.call_args_list)
+        self.assertEqual(written, "\n".join(iter_plantuml(commits)) + "\n")
+
+    def test_apply_delta(self):
+        # Исходник 11 байт, результат 9: копия "hello" из базы и вставка "!!!!"
+        delta = bytes([11, 9, 0x90, 5, 4]) + b"!!!!"
+        self.assertEqual(apply_delta(b"hello world", delta), b"hello!!!!")
+        with self.assertRaises(ValueError):
+            apply_delta(b"hello world", bytes([11, 9, 0]))
+
+    @unittest.skipUnless(shutil.which("git"), "git is not installed")
+    def test_native_reader(self):
+        # Чтение .git напрямую даёт те же записи, что и git log: и из pack-файла с дельтами,
+        # и из отдельного объекта, с учётом слияний и фильтра по дате
+        with tempfile.TemporaryDirectory() as repo:
+            env = dict(os.environ, GIT_AUTHOR_NAME="Автор", GIT_AUTHOR_EMAIL="a@example.com",
+                       GIT_COMMITTER_NAME="Автор", GIT_COMMITTER_EMAIL="a@example.com")
+            git = lambda *args, **kwargs: subprocess.run(["git", *args], cwd=repo, env=env, check=True,
+                                                         capture_output=True, **kwargs)
+            git("init", "-q")
+            for day in (1, 3, 5, 7, 9):  # Пропуски между днями: git log отсекает --before по текущему времени суток
+                env["GIT_AUTHOR_DATE"] = f"2021-03-0{day}T09:00:00-0530"
+                env["GIT_COMMITTER_DATE"] = f"2021-03-0{day}T12:00:00+0300"
+                Path(repo, "file.txt").write_text("line\n" * 100 + f"{day}\n")
+                git("add", "file.txt")
+                git("commit", "-q", "-m", f"commit {day}")
+                if day == 3:
+                    git("checkout", "-q", "-b", "side")
+                    Path(repo, "side.txt").write_text("side\n")
+                    git("add", "side.txt")
+                    git("commit", "-q", "-m", "side")
+                    git("checkout", "-q", "-")
+                if day == 5:
+                    git("merge", "-q", "--no-edit", "side")
+                if day == 7:
+                    git("repack", "-adq", "--depth=10")  # Последний коммит остаётся отдельным объектом
+            for before_date in ("2030-01-01", "2021-03-04"):
+                expected = [(c.hash, c.parents, c.author, c.date) for c in read_commits(repo, before_date)]
+                actual = [(c.hash, c.parents, c.author, c.date) for c in walk_commits(repo, before_date)]
+                self.assertEqual(actual, expected)
+            self.assertEqual(len(expected), 3)
+
+            # Коммит, сделанный сегодня раньше текущего времени, попадает в --before-date сегодняшнего дня
+            today = datetime.date.today().isoformat()
+            env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = f"{today}T00:00:01"
+            git("commit", "-q", "--allow-empty", "-m", "today")
+            expected = [(c.hash, c.parents, c.author, c.date) for c in read_commits(repo, today)]
+            actual = [(c.hash, c.parents, c.author, c.date) for c in walk_commits(repo, today)]
+            self.assertEqual(actual, expected)
+            self.assertEqual(len(expected), 8)
+
+    @unittest.skipUnless(shutil.which("git"), "git is not installed")
+    def test_commit_cache(self):
+        with tempfile.TemporaryDirectory() as repo, tempfile.TemporaryDirectory() as cache_dir:
+            env = dict(os.environ, GIT_AUTHOR_NAME="A|B", GIT_AUTHOR_EMAIL="a@example.com",
+                       GIT_COMMITTER_NAME="A|B", GIT_COMMITTER_EMAIL="a@example.com")
+
+            def commit(day, *extra):
+                env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = f"2021-03-{day:02}T12:00:00+0000"
+                subprocess.run(["git", "commit", "-q", "--allow-empty", "-m", f"day {day}", *extra],
+                               cwd=repo, env=env, check=True)
+
+            def records(commits):
+                return [(c.hash, c.parents, c.author, c.date) for c in commits]
+
+            subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+            for day in (1, 3, 5):
+                commit(day)
+            cache = CommitCache(repo, cache_dir)
+            self.assertEqual(cache.update(), 3)
+            self.assertEqual(records(cache.query("2030-01-01")), records(walk_commits(repo, "2030-01-01")))
+
+            # Второй запуск дочитывает только новые коммиты, старые берутся с диска
+            commit(7)
+            commit(9)
+            cache = CommitCache(repo, cache_dir)
+            self.assertEqual(len(cache.commits), 3)
+            self.assertEqual(cache.update(), 2)
+            self.assertEqual(cache.update(), 0)
+            for before_date in ("2030-01-01", "2021-03-06", "2021-03-01"):
+                self.assertEqual(records(cache.query(before_date)), records(walk_commits(repo, before_date)))
+
+            # После переписывания истории кэш собирается заново
+            commit(10, "--amend")
+            self.assertEqual(cache.update(), 5)
+            self.assertEqual(records(CommitCache(repo, cache_dir).query("2030-01-01")),
+                             records(walk_commits(repo, "2030-01-01")))
+
+            # Коммит, сделанный сегодня раньше текущего времени, входит в выборку по сегодняшней дате
+            today = datetime.date.today().isoformat()
+            env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = f"{today}T00:00:01"
+            subprocess.run(["git", "commit", "-q", "--allow-empty", "-m", "today"], cwd=repo, env=env, check=True)
+            self.assertEqual(cache.update(), 1)
+            self.assertEqual(records(cache.query(today)), records(walk_commits(repo, today)))
+            self.assertEqual(len(records(cache.query(today))), 6)
+
+    @unittest.skipUnless(shutil.which("git"), "git is not installed")
+    def test_profile_phases(self):
+        # С --profile история читается по фазам, записи те же, что и при потоковом чтении
+        with tempfile.TemporaryDirectory() as repo, tempfile.TemporaryDirectory() as cache_dir:
+            env = dict(os.environ, GIT_AUTHOR_NAME="A", GIT_AUTHOR_EMAIL="a@example.com",
+                       GIT_COMMITTER_NAME="A", GIT_COMMITTER_EMAIL="a@example.com")
+            subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+            for day in (1, 2):
+                env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = f"2021-03-0{day}T12:00:00+0000"
+                subprocess.run(["git", "commit", "-q", "--allow-empty", "-m", f"day {day}"],
+                               cwd=repo, env=env, check=True)
+            report_path = Path(cache_dir, "profile.json")
+            for reader, phases in (("git", {"fetch", "parse"}), ("native", {"fetch"}), ("cache", {"fetch", "parse"})):
+                with profiling("grapher", "json", str(report_path)):
+                    actual = read_commits_by_phase(repo, "2030-01-01", reader, cache_dir)
+                expected = read_commits(repo, "2030-01-01", reader, cache_dir)
+                self.assertEqual([c.hash for c in actual], [c.hash for c in expected])
+                report = json.loads(report_path.read_text(encoding="utf-8"))
+                self.assertEqual(set(report["phases"]), phases)
+                self.assertEqual(report["counters"], {"commits": 2})
+
+    def test_reduce_graph(self):
+        # A <- B <- C <- D, от D две ветки E <- F и G <- H, слияние M и вершина N
+        graph = {"N": "M", "M": "H F", "H": "G", "F": "E", "G": "D", "E": "D",
+                 "D": "C", "C": "B", "B": "A", "A": ""}
+        commits = [Commit(hash_, tuple(parents.split()), "author", f"2024-01-{10 - day:02} 12:00:00 +0000")
+                   for day, (hash_, parents) in enumerate(graph.items())]
+        shape = lambda nodes: [(node.hash, node.parents, getattr(node, "count", 1)) for node in nodes]
+
+        self.assertEqual(shape(reduce_graph(commits, collapse=True)), [
+            ("N", ("M",), 1), ("M", ("H", "F"), 1), ("H", ("D",), 2), ("F", ("D",), 2),
+            ("D", ("C",), 1), ("C", ("A",), 2), ("A", (), 1)])
+        key = reduce_graph(commits, key_only=True)
+        self.assertEqual(shape(key), [("N", ("M",), 1), ("M", ("D", "D"), 1), ("D", ("A",), 1), ("A", (), 1)])
+        self.assertEqual(count_edges(key), 4)
+        self.assertEqual(shape(reduce_graph(commits, max_nodes=3)),
+                         [("N", ("M",), 1), ("M", ("D", "D"), 1), ("D", (), 1)])
+        self.assertEqual([node.hash for node in reduce_graph(commits, first_parent=True)],
+                         ["N", "M", "H", "G", "D", "C", "B", "A"])
+        self.assertEqual(reduce_graph(commits, first_parent=True)[1].parents, ("H",))
+        self.assertEqual(shape(reduce_graph(commits, since="2024-01-07")),
+                         [("N", ("M",), 1), ("M", ("H", "F"), 1), ("H", (), 1), ("F", (), 1)])
+        self.assertIn("(2 commits)", "\n".join(iter_plantuml(reduce_graph(commits, collapse=True))))
+
+    def test_svg_layout(self):
+        graph = {"N": "M", "M": "H F", "H": "G", "F": "E", "G": "D", "E": "D",
+                 "D": "C", "C": "B", "B": "A", "A": ""}
+        commits = [Commit(hash_, tuple(parents.split()), "<author>", "2024-01-01") for hash_, parents in graph.items()]
+        order, positions, width = layout(commits)
+        # Каждый коммит на своей строке, потомки выше родителей, ветки в двух дорожках
+        self.assertEqual(sorted(row for _, row in positions.values()), list(range(len(commits))))
+        for commit in commits:
+            for parent in commit.parents:
+                self.assertLess(positions[commit.hash][1], positions[parent][1])
+        self.assertEqual(width, 2)
+        self.assertEqual([commit.hash for commit in order], ["N", "M", "H", "G", "F", "E", "D", "C", "B", "A"])
+
+        svg = "\n".join(iter_svg(commits))
+        self.assertEqual(svg.count("<circle"), 10)
+        self.assertEqual(svg.count("<polyline"), 10)
+        self.assertIn("&lt;author&gt;", svg)
+        dot = list(iter_dot(commits))
+        self.assertIn('  "H" -> "M";', dot)
+        self.assertIn('  "F" -> "M";', dot)
+
+    @unittest.skipUnless(shutil.which("git"), "git is not installed")
+    def test_failed_read_keeps_output(self):
+        # Ошибка git log не оставляет .puml и не портит уже нарисованный граф
+        with tempfile.TemporaryDirectory() as not_repo, tempfile.TemporaryDirectory() as out_dir:
+            for renderer in ("plantuml", "dot", "svg"):
+                output_path = os.path.join(out_dir, f"graph.{renderer}")
+                Path(output_path).write_text("old")
+                args = argparse.Namespace(repo_path=not_repo, before_date="2030-01-01", reader="git",
+                                          cache_dir=out_dir, since=None, first_parent=False,
+                                          collapse_chains=False, key_commits=False, max_nodes=None,
+                                          renderer=renderer, output_path=output_path, plantuml_path="plantuml.jar")
+                with self.assertRaises(subprocess.CalledProcessError):
+                    draw_graph(args)
+                self.assertEqual(Path(output_path).read_text(), "old")
+            self.assertEqual(sorted(os.listdir(out_dir)), ["graph.dot", "graph.plantuml", "graph.svg"])
+
+    def test_commit_index(self):
+        graph = {"N": "M", "M": "H F", "H": "G", "F": "E", "G": "D", "E": "D",
+                 "D": "C", "C": "B", "B": "A", "A": ""}
+        index = CommitIndex.from_commit_data({hash_: {"parents": parents.split(), "author": f"author{len(parents)}",
+                                                      "date": f"2024-01-0{1 + len(hash_) % 2} 12:00:00 +0000"}
+                                              for hash_, parents in graph.items()})
+        self.assertEqual(len(index), 10)
+        self.assertEqual(len(index.parent_ids), 10)
+        self.assertEqual(sorted(index.ancestors("H")), ["A", "B", "C", "D", "G"])
+        self.assertEqual(sorted(index.descendants("E")), ["F", "M", "N"])
+        self.assertTrue(index.is_ancestor("A", "N"))
+        self.assertTrue(index.is_ancestor("E", "M"))
+        self.assertFalse(index.is_ancestor("E", "H"))
+        self.assertFalse(index.is_ancestor("N", "A"))
+        self.assertEqual(index.merge_base("H", "F"), ["D"])
+        self.assertEqual(index.merge_base("M", "F"), ["F"])
+        self.assertEqual(index.merge_base("N", "N"), ["N"])
+        path = index.longest_path()
+        self.assertEqual((len(path), path[0], path[-1]), (8, "A", "N"))
+        self.assertEqual(index.author_counts(), [("author1", 8), ("author3", 1), ("author0", 1)])
+        self.assertEqual(index.commits_per_day(), [("2024-01-02", 10)])
+        with self.assertRaises(KeyError):
+            index.id_of("Z")
+
+        # Перекрёстное слияние: два лучших общих предка
+        criss_cross = CommitIndex([Commit("P", ("B", "C"), "a", "2024-01-03"), Commit("Q", ("C", "B"), "a", "2024-01-03"),
+                                   Commit("B", ("A",), "a", "2024-01-02"), Commit("C", ("A",), "a", "2024-01-02"),
+                                   Commit("A", (), "a", "2024-01-01")])
+        self.assertEqual(sorted(criss_cross.merge_base("P", "Q")), ["B", "C"])
+
+    def test_query_unknown_commit(self):
+        # Неизвестный хеш: одна строка ошибки и ненулевой код возврата вместо трассировки KeyError
+        commits = [Commit("abc", (), "a", "2024-01-01")]
+        argv = ["query.py", "--repo-path", ".", "--before-date", "2030-01-01", "--ancestors", "zzz"]
+        with patch("sys.argv", argv), patch("query.read_commits", return_value=commits):
+            with self.assertRaises(SystemExit) as context:
+                query.main()
+        self.assertEqual(context.exception.code, "Error: Commit 'zzz' is not found.")
+
+    def test_plantuml_pipe(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            script = Path(workdir, "fake_plantuml.py")
+            script.write_text(FAKE_PLANTUML)
+            command = [sys.executable, str(script)]
+
+            # Один процесс отрисовывает диаграммы одну за другой
+            renderer = PlantUmlRenderer(command)
+            self.assertEqual(renderer.render(["@startuml", "  a --> b", "@enduml"]), b"3:1")
+            self.assertEqual(renderer.render(["@startuml", "@enduml"]), b"2:2")
+            renderer.close()
+
+            # Упавший рендерер заменяется новым процессом
+            pool = RendererPool(command, size=1)
+            with self.assertRaises(RuntimeError):
+                pool.render(["crash"])
+            self.assertEqual(pool.render(["@startuml", "@enduml"]), b"2:1")
+
+            # Если новый процесс не запускается, пул уменьшается, а не возвращает закрытый рендерер
+            broken_pool = RendererPool(command, size=2)
+            broken_pool.command = [os.path.join(workdir, "missing-binary")]
+            with self.assertRaises(FileNotFoundError):
+                broken_pool.render(["crash"])
+            self.assertEqual(broken_pool.size, 1)
+            self.assertEqual(broken_pool.render(["@startuml", "@enduml"]), b"2:1")
+            with self.assertRaises(FileNotFoundError):
+                broken_pool.render(["crash"])
+            with self.assertRaisesRegex(RuntimeError, "No PlantUML renderers"):
+                broken_pool.render(["@startuml", "@enduml"])
+            broken_pool.close()
+
+            # Ошибка одного задания не мешает остальным
+            commits = [Commit("hash2", ("hash1",), "author", "2024-06-02"), Commit("hash1", (), "author", "2024-06-01")]
+
+            def fake_read(repo_path, *args):
+                if repo_path == "broken":
+                    raise subprocess.CalledProcessError(128, ["git", "log"])
+                return iter(commits)
+
+            jobs = [("repo", "2024-07-01", os.path.join(workdir, "out", "a.png")),
+                    ("broken", "2024-07-01", os.path.join(workdir, "out", "b.png"))]
+            with patch("batch.read_commits", side_effect=fake_read):
+                results = run_batch(jobs, pool, workers=2)
+            pool.close()
+            self.assertEqual([(result[1], result[5] is None) for result in results], [(2, True), (0, False)])
+            self.assertEqual(Path(workdir, "out", "a.png").read_bytes(), b"5:2")
+
+    @unittest.skipUnless(shutil.which("git"), "git is not installed")
+    def test_run_manifest(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ, GIT_AUTHOR_NAME="author", GIT_AUTHOR_EMAIL="a@example.com",
+                       GIT_COMMITTER_NAME="author", GIT_COMMITTER_EMAIL="a@example.com",
+                       GIT_AUTHOR_DATE="2021-03-01T12:00:00+0000", GIT_COMMITTER_DATE="2021-03-01T12:00:00+0000")
+            repos = [os.path.join(workdir, "a", "repo"), os.path.join(workdir, "b", "repo")]
+            for commits, repo in enumerate(repos, start=1):
+                os.makedirs(repo)
+                subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+                for _ in range(commits):
+                    subprocess.run(["git", "commit", "-q", "--allow-empty", "-m", "commit"],
+                                   cwd=repo, env=env, check=True)
+            not_a_repo = os.path.join(workdir, "plain")
+            os.makedirs(not_a_repo)
+            manifest = Path(workdir, "manifest.txt")
+            manifest.write_text("\n".join(["# nightly", *repos, not_a_repo, os.path.join(workdir, "missing"), ""]))
+            output_dir = os.path.join(workdir, "out")
+            jobs = read_manifest(manifest, "2030-01-01", output_dir)
+            self.assertEqual([Path(job[2]).name for job in jobs], ["repo.png", "repo-2.png", "plain.png", "missing.png"])
+
+            script = Path(workdir, "fake_plantuml.py")
+            script.write_text(FAKE_PLANTUML)
+            pool = RendererPool([sys.executable, str(script)], size=2)
+            results = asyncio.run(run_manifest(jobs, pool, fetch_limit=2, render_limit=1))
+            pool.close()
+            # Неудачные репозитории не мешают остальным
+            self.assertEqual([(result[1], result[5] is None) for result in results],
+                             [(1, True), (2, True), (0, False), (0, False)])
+            self.assertIn("not a git repository", results[2][5].stderr)
+            self.assertEqual(sorted(os.listdir(output_dir)), ["repo-2.png", "repo.png"])
+
     @patch("subprocess.run")
     @patch("builtins.open", new_callable=mock_open)
     @patch("os.remove")
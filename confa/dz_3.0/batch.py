@@ -0,0 +1,140 @@
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from main import ConfigToToml
+
+DEFAULT_PATTERN = "*.txt"  # Какие файлы брать из каталогов, указанных в командной строке
+
+prelude_constants = {}  # Константы общего пролога в процессе-исполнителе
+
+def collect_files(sources, pattern=DEFAULT_PATTERN, output_dir=None):
+    # Задания (входной файл, выходной файл) по путям, шаблонам glob и каталогам.
+    # Без output_dir TOML пишется рядом с входным файлом; с ним файлы из каталога сохраняют
+    # относительный путь, а совпадающие имена получают номер
+    jobs = []
+    seen_inputs = set()
+    outputs = set()
+    for source in sources:
+        if os.path.isdir(source):
+            base = Path(source)
+            paths = sorted(path for path in base.rglob(pattern) if path.is_file())
+        else:
+            matches = sorted(glob.glob(source, recursive=True)) or [source]
+            base = None
+            paths = [Path(match) for match in matches]
+        for path in paths:
+            resolved = path.resolve()
+            if resolved in seen_inputs:
+                continue
+            seen_inputs.add(resolved)
+            if output_dir is None:
+                output = path.with_suffix(".toml")
+            else:
+                relative = path.relative_to(base) if base is not None else Path(path.name)
+                output = Path(output_dir) / relative.with_suffix(".toml")
+            unique = output
+            number = 1
+            while unique in outputs:
+                number += 1
+                unique = output.with_name(f"{output.stem}-{number}{output.suffix}")
+            outputs.add(unique)
+            jobs.append((str(path), str(unique)))
+    return jobs
+
+def load_prelude(prelude_path):
+    # Пролог разбирается один раз; в остальные файлы попадают только его константы (:=)
+    translator = ConfigToToml()
+    with open(prelude_path, encoding="utf-8") as file:
+        translator.process(file.read())
+    return translator.constants
+
+def init_worker(constants):
+    global prelude_constants
+    prelude_constants = constants
+
+def file_mode(path):
+    # Права существующего файла; для нового - обычные права с учётом umask
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+def write_atomic(text, output_path):
+    # Запись во временный файл в том же каталоге и замена: читатель видит либо старый,
+    # либо полностью записанный файл
+    output_dir = os.path.dirname(output_path) or "."
+    os.makedirs(output_dir, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=output_dir, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.chmod(temp_path, file_mode(output_path))  # mkstemp создаёт файл с правами 0600
+        os.replace(temp_path, output_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def translate_file(job):
+    # Перевод одного файла в собственной области видимости с копией констант пролога.
+    # Результат: (входной файл, выходной файл, время, текст ошибки или None)
+    input_path, output_path = job
+    start = time.perf_counter()
+    try:
+        translator = ConfigToToml()
+        translator.constants.update(prelude_constants)
+        with open(input_path, encoding="utf-8") as file:
+            translator.process(file.read())
+        write_atomic(translator.to_toml() + "\n", output_path)
+        return input_path, output_path, time.perf_counter() - start, None
+    except Exception as e:
+        return input_path, output_path, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+def run_batch(jobs, constants, workers):
+    # Файлы переводятся в пуле процессов; ошибка одного файла не останавливает остальные.
+    # При workers == 1 всё выполняется в текущем процессе
+    if workers == 1:
+        init_worker(constants)
+        return [translate_file(job) for job in jobs]
+    chunksize = max(1, len(jobs) // (workers * 8))  # Мелкие файлы передаются пачками
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(constants,)) as executor:
+        return list(executor.map(translate_file, jobs, chunksize=chunksize))
+
+def print_summary(results, elapsed):
+    failed = 0
+    for input_path, output_path, file_time, error in results:
+        if error is not None:
+            failed += 1
+            print(f"{input_path}: {error}")
+    rate = len(results) / elapsed if elapsed else 0.0
+    print(f"{len(results) - failed} succeeded, {failed} failed in {elapsed:.2f} s ({rate:.0f} files/s)")
+    return failed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Translate many config files to TOML in parallel.")
+    parser.add_argument("sources", nargs="+", help="Config files, glob patterns or directories.")
+    parser.add_argument("--pattern", default=DEFAULT_PATTERN,
+                        help="File name pattern used inside directories (default: %(default)s).")
+    parser.add_argument("--prelude", help="Config file whose constants are available in every file.")
+    parser.add_argument("--output-dir", help="Directory for the TOML files; by default each is written next to its input.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    constants = load_prelude(args.prelude) if args.prelude else {}
+    jobs = collect_files(args.sources, args.pattern, args.output_dir)
+    start = time.perf_counter()
+    results = run_batch(jobs, constants, max(1, args.workers))
+    if print_summary(results, time.perf_counter() - start):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
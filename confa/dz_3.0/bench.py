@@ -0,0 +1,283 @@
+import argparse
+import math
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+
+from batch import collect_files, run_batch
+from incremental import IncrementalTranslator
+from main import ConfigToToml
+
+class LineConfigToToml(ConfigToToml):
+    """Прежний построчный разбор (re.match на каждую лексему, split по '=' и ';') для сравнения."""
+
+    def evaluate(self, expr):
+        if re.match(r"^\d+(\.\d+)?$", expr):
+            return float(expr) if '.' in expr else int(expr)
+        elif re.match(r"^'.*'$", expr):
+            return expr.strip("'")
+        elif expr in self.constants:
+            return self.constants[expr]
+        elif expr.startswith("|") and expr.endswith("|"):
+            return self.evaluate_postfix(expr[1:-1].strip())
+        else:
+            raise ValueError(f"Unknown token in expression: {expr}")
+
+    def evaluate_postfix(self, expr):
+        stack = []
+        for token in expr.split():
+            if re.match(r"^\d+(\.\d+)?$", token):
+                stack.append(float(token) if '.' in token else int(token))
+            elif token in self.constants:
+                stack.append(self.constants[token])
+            elif token in "+-*/":
+                b = stack.pop()
+                a = stack.pop()
+                if token == "+":
+                    stack.append(a + b)
+                elif token == "-":
+                    stack.append(a - b)
+                elif token == "*":
+                    stack.append(a * b)
+                elif token == "/":
+                    stack.append(a / b)
+            elif token == "sqrt":
+                stack.append(math.sqrt(stack.pop()))
+            elif token == "ord":
+                stack.append(ord(str(stack.pop())))
+            else:
+                raise ValueError(f"Unknown token in expression: {token}")
+        return stack.pop()
+
+    def process_array(self, text):
+        return [self.evaluate(item.strip()) for item in text[1:-1].split(";") if item.strip()]
+
+    def process_dict(self, text):
+        result = {}
+        for item in text[1:-1].strip().split(";"):
+            if "=" in item:
+                name, value = map(str.strip, item.split("=", 1))
+                result[name] = self.evaluate(value)
+        return result
+
+    def process_line(self, line):
+        self.line_num += 1
+        if line.endswith(";"):
+            line = line[:-1].strip()
+        if ":=" in line:
+            name, value = map(str.strip, line.split(":=", 1))
+            self.constants[name] = self.evaluate(value)
+        elif "=" in line:
+            name, value = map(str.strip, line.split("=", 1))
+            if value.startswith("[") and value.endswith("]"):
+                self.current_scope[name] = self.process_array(value)
+            elif value.startswith("{") and value.endswith("}"):
+                self.current_scope[name] = self.process_dict(value)
+            else:
+                self.current_scope[name] = self.evaluate(value)
+        else:
+            raise SyntaxError(f"Invalid syntax on line {self.line_num}: {line}")
+
+    def process(self, input_text):
+        inside_comment = False
+        for line in input_text.strip().split("\n"):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("(comment"):
+                inside_comment = True
+                continue
+            if inside_comment:
+                if line.endswith(")"):
+                    inside_comment = False
+                continue
+            self.process_line(line)
+
+EXPRESSIONS = 100  # Число различных постфиксных выражений каждого вида
+
+def legacy_to_toml(scope):
+    # Прежние to_toml и format_value: список строк и str() для значений
+    def format_value(value):
+        if isinstance(value, str):
+            return f"'{value}'"
+        elif isinstance(value, list):
+            return f"[{', '.join(map(str, value))}]"
+        else:
+            return str(value)
+
+    result = []
+    for key, value in scope.items():
+        if isinstance(value, dict):
+            result.append(f"[{key}]")
+            for sub_key, sub_value in value.items():
+                result.append(f"{sub_key} = {format_value(sub_value)}")
+        else:
+            result.append(f"{key} = {format_value(value)}")
+    return "\n".join(result)
+
+def make_config(lines):
+    # Синтетический конфиг из lines строк: константы, числа, строки, массивы,
+    # словари, постфиксные выражения и изредка комментарии
+    parts = []
+    for i in range(lines):
+        kind = i % 10
+        if kind == 0:
+            parts.append(f"C{i} := {i}")
+        elif kind in (1, 2):
+            parts.append(f"num{i} = {i};")
+        elif kind == 3:
+            parts.append(f"str{i} = 'value {i}';")
+        elif kind == 4:
+            parts.append(f"arr{i} = [1; 2.5; C{i - 4}; 'x'];")
+        elif kind == 5:
+            parts.append(f"dict{i} = {{ a = 1; b = 'two'; c = C{i - 5} }}")
+        elif kind == 6:
+            # Выражения повторяются: ссылаются на одну из первых EXPRESSIONS констант
+            parts.append(f"expr{i} = |C{i // 10 % EXPRESSIONS * 10} 2 * 1 +|;")
+        elif kind == 7:
+            parts.append(f"root{i} = |C{i // 10 % EXPRESSIONS * 10} sqrt 2 2 * +|;")
+        elif kind == 8:
+            parts.append(f"float{i} = {i}.25;")
+        elif i % 1000 == 9:
+            parts.append("(comment\nгенерированный комментарий\n)")
+        else:
+            parts.append(f"last{i} = C{i - 9};")
+    return "\n".join(parts) + "\n"
+
+def measure(translator_class, text):
+    translator = translator_class()
+    start = time.perf_counter()
+    translator.process(text)
+    return time.perf_counter() - start, translator.current_scope
+
+def stream_file(path):
+    # Вход читается построчно из файла, как из stdin; вывод отбрасывается
+    with open(path, encoding="utf-8") as file:
+        ConfigToToml().process_stream(file, len)
+
+def measure_stream(path):
+    start = time.perf_counter()
+    stream_file(path)
+    return time.perf_counter() - start
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def measure_batch(files, lines, workers_counts):
+    # Пакетный перевод files одинаковых файлов по lines строк при разном числе процессов
+    with tempfile.TemporaryDirectory() as directory:
+        text = make_config(lines)
+        for number in range(files):
+            with open(os.path.join(directory, f"config{number}.txt"), "w", encoding="utf-8") as file:
+                file.write(text)
+        jobs = collect_files([directory], output_dir=os.path.join(directory, "out"))
+        print(f"{'files':>8} {'lines':>8} {'workers':>8} {'time, s':>8} {'files/s':>8}")
+        for workers in workers_counts:
+            start = time.perf_counter()
+            results = run_batch(jobs, {}, workers)
+            elapsed = time.perf_counter() - start
+            if any(error for *_, error in results):
+                print("Warning: some files failed")
+            print(f"{files:>8} {lines:>8} {workers:>8} {elapsed:>8.3f} {files / elapsed:>8.0f}")
+
+def measure_edits(lines):
+    # Повторный перевод после правки значения и правки константы, от которой зависят выражения
+    text = make_config(lines)
+    translator = IncrementalTranslator()
+    start = time.perf_counter()
+    translator.translate(text)
+    print(f"{lines:>10} {'first run':>14} {time.perf_counter() - start:>8.3f} {translator.evaluated:>10}")
+    middle = lines // 2 // 10 * 10
+    edits = (("value", text.replace(f"num{middle + 1} = {middle + 1};", f"num{middle + 1} = 7;", 1)),
+             ("constant", text.replace("C0 := 0\n", "C0 := 5\n", 1)))
+    for name, edited in edits:
+        start = time.perf_counter()
+        translator.translate(edited)
+        print(f"{lines:>10} {name + ' edit':>14} {time.perf_counter() - start:>8.3f} {translator.evaluated:>10}")
+        translator.translate(text)
+
+def measure_emit(lines):
+    # Вывод TOML для результата разбора конфига из lines строк
+    translator = ConfigToToml()
+    translator.process(make_config(lines))
+    scope = translator.current_scope
+    start = time.perf_counter()
+    size = len(legacy_to_toml(scope))
+    runs = [("legacy join", time.perf_counter() - start)]
+    start = time.perf_counter()
+    translator.to_toml()
+    runs.append(("to_toml", time.perf_counter() - start))
+    with tempfile.TemporaryFile("w", encoding="utf-8") as file:
+        start = time.perf_counter()
+        translator.write_toml(file)
+        file.flush()
+        runs.append(("write_toml", time.perf_counter() - start))
+    for name, elapsed in runs:
+        print(f"{lines:>10} {name:>12} {elapsed:>8.3f} {size / elapsed / 2 ** 20:>10.1f}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the line-based, the single-pass and the streaming config parsers.")
+    parser.add_argument("--lines", type=int, nargs="+", default=[100_000, 1_000_000],
+                        help="Numbers of lines in the generated configs.")
+    parser.add_argument("--memory", action="store_true",
+                        help="Also report peak memory of the whole-text and the streaming translation (slow).")
+    parser.add_argument("--emit", action="store_true",
+                        help="Instead of the parser comparison, time TOML output of the parsed configs.")
+    parser.add_argument("--edits", action="store_true",
+                        help="Instead of the parser comparison, time incremental re-translation after small edits.")
+    parser.add_argument("--files", type=int,
+                        help="Instead of the parser comparison, translate this many generated files with batch.py.")
+    parser.add_argument("--file-lines", type=int, default=200, help="Lines in each generated file for --files.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Numbers of worker processes compared with --files.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.files:
+        measure_batch(args.files, args.file_lines, args.workers)
+        return
+    if args.emit:
+        print(f"{'lines':>10} {'emitter':>12} {'time, s':>8} {'MiB/s':>10}")
+        for lines in args.lines:
+            measure_emit(lines)
+        return
+    if args.edits:
+        print(f"{'lines':>10} {'run':>14} {'time, s':>8} {'evaluated':>10}")
+        for lines in args.lines:
+            measure_edits(lines)
+        return
+    print(f"{'lines':>10} {'parser':>12} {'time, s':>8} {'lines/s':>10}")
+    for lines in args.lines:
+        text = make_config(lines)
+        results = {}
+        for name, translator_class in (("line-based", LineConfigToToml), ("single-pass", ConfigToToml)):
+            elapsed, results[name] = measure(translator_class, text)
+            print(f"{lines:>10} {name:>12} {elapsed:>8.3f} {lines / elapsed:>10.0f}")
+        if results["line-based"] != results["single-pass"]:
+            print("Warning: parsers produced different results")
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".conf", delete=False) as file:
+            file.write(text)
+        elapsed = measure_stream(file.name)
+        print(f"{lines:>10} {'streaming':>12} {elapsed:>8.3f} {lines / elapsed:>10.0f}")
+        if args.memory:
+            # Память сверх уже загруженного текста: разбор с выводом TOML целиком против потокового
+            def whole():
+                translator = ConfigToToml()
+                translator.process(text)
+                translator.to_toml()
+            whole_peak = peak_memory(whole)
+            stream_peak = peak_memory(lambda: stream_file(file.name))
+            print(f"{lines:>10} peak memory: whole text {whole_peak / 2 ** 20:.1f} MiB, "
+                  f"streaming {stream_peak / 2 ** 20:.1f} MiB")
+        os.remove(file.name)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import argparse
+import os
+import pickle
+import time
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from operator import itemgetter
+
+from batch import write_atomic
+from main import (EOF, COMMENT_START_RE, NAME_START, OPERATORS, TOKEN_RE, ConfigToToml, Parser, split_chunks,
+                  strip_comments)
+
+BLOCK = 4096  # Сколько строк сравнивается за раз при поиске общего начала и конца текстов
+MISSING = object()
+# Поля записи присваивания: (имя ключа или None, имя константы или None, лексемы значения,
+# имена-ссылки, значение, строки TOML). Два поля имени позволяют собирать словари на C
+SCOPE_NAME, CONSTANT_NAME, RESULT, ENTRY = itemgetter(0), itemgetter(1), itemgetter(4), itemgetter(5)
+
+def references(tokens):
+    # Имена в значении, которые могут быть константами; ключи словарей тоже попадают сюда,
+    # что даёт лишнюю зависимость, но не ошибку
+    names = []
+    for token in tokens:
+        if token[:1] in NAME_START:
+            if token not in OPERATORS:
+                names.append(token)
+        elif token[:1] == "|" and len(token) > 1:
+            names.extend(name for name in TOKEN_RE.findall(token[1:-1])
+                         if name[:1] in NAME_START and name not in OPERATORS)
+    return frozenset(names)
+
+def split_statements(tokens, line):
+    # Присваивания из лексем, начинающихся на строке line (с нуля):
+    # (первая строка, строка после последней, имя, оператор, лексемы значения, имена-ссылки).
+    # Разделитель - ';' или перевод строки вне скобок и вне многострочного постфиксного выражения.
+    # Если последнее присваивание не закончено, возвращается None
+    statements = []
+    position = 0
+    count = len(tokens)
+    while position < count:
+        token = tokens[position]
+        position += 1
+        if token == "\n":
+            line += 1
+            continue
+        if token == ";":
+            continue
+        if token[0] not in NAME_START:
+            raise SyntaxError(f"Invalid syntax: unexpected {token!r} on line {line + 1}")
+        if position == count:
+            return None
+        operator = tokens[position]
+        position += 1
+        if operator != "=" and operator != ":=":
+            raise SyntaxError(f"Invalid syntax: expected ':=' or '=' after {token!r} on line {line + 1}")
+        start = line
+        value = []
+        depth = 0
+        in_postfix = False
+        while position < count:
+            part = tokens[position]
+            position += 1
+            if part == "|":
+                in_postfix = not in_postfix
+            elif part == "[" or part == "{":
+                depth += 1
+            elif part == "]" or part == "}":
+                depth -= 1
+            elif part == "\n" and not depth and not in_postfix:
+                position -= 1  # Перевод строки посчитается во внешнем цикле
+                break
+            elif part == "\n":
+                line += 1
+            elif part == ";" and not depth and not in_postfix:
+                break
+            value.append(part)
+        else:
+            if depth or in_postfix or not value:
+                return None
+        statements.append((start, line + 1, token, operator, tuple(value), references(value)))
+    return statements
+
+def common_prefix(old, new):
+    # Число одинаковых строк в начале; блоки сравниваются целиком на C
+    limit = min(len(old), len(new))
+    start = 0
+    while start + BLOCK <= limit and old[start:start + BLOCK] == new[start:start + BLOCK]:
+        start += BLOCK
+    while start < limit and old[start] == new[start]:
+        start += 1
+    return start
+
+def common_suffix(old, new, limit):
+    # Число одинаковых строк в конце, не больше limit
+    end = 0
+    while end + BLOCK <= limit and old[len(old) - end - BLOCK:len(old) - end] == new[len(new) - end - BLOCK:len(new) - end]:
+        end += BLOCK
+    while end < limit and old[len(old) - end - 1] == new[len(new) - end - 1]:
+        end += 1
+    return end
+
+class IncrementalTranslator:
+    # Перевод с сохранением результатов присваиваний между запусками.
+    # Новый текст сравнивается с предыдущим по строкам: присваивания в общем начале и конце
+    # не разбираются заново. Присваивания на изменённых строках вычисляются заново, а после них -
+    # те, что ссылаются на константы (:=), значение которых изменилось (граф зависимостей задан
+    # именами-ссылками присваиваний). Обход заканчивается, когда изменённых констант не осталось:
+    # новое определение константы закрывает старое
+    def __init__(self):
+        self.lines = []  # Строки текста без комментариев
+        self.starts = []  # Первая строка каждого присваивания
+        self.ends = []  # Строка после последней строки каждого присваивания
+        self.records = []  # Записи присваиваний, см. SCOPE_NAME и др.
+        self.evaluated = 0
+        self.reused = 0
+
+    @classmethod
+    def load(cls, cache_path):
+        translator = cls()
+        try:
+            with open(cache_path, "rb") as file:
+                translator.lines, translator.starts, translator.ends, translator.records = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+            pass
+        return translator
+
+    def save(self, cache_path):
+        with open(cache_path, "wb") as file:
+            pickle.dump((self.lines, self.starts, self.ends, self.records), file, pickle.HIGHEST_PROTOCOL)
+
+    def evaluate(self, parser, name, operator, value, names, line):
+        parser.next_token = iter(value + (EOF,)).__next__
+        parser.line = line + 1
+        result, token = parser.parse_value(parser.next_token())
+        if token != EOF:
+            raise parser.error(f"Invalid syntax: unexpected {token!r}", token)
+        self.evaluated += 1
+        if operator == "=":
+            return name, None, value, names, result, tuple(parser.translator.format_entry(name, result))
+        return None, name, value, names, result, ()
+
+    def translate(self, text):
+        if COMMENT_START_RE.search(text):
+            text = "".join(strip_comments(split_chunks(text)))
+        lines = text.split("\n")
+        old_lines, starts, ends, records = self.lines, self.starts, self.ends, self.records
+        self.evaluated = 0
+
+        # Изменённые строки: [prefix, len(old_lines) - suffix) в старом тексте
+        prefix = common_prefix(old_lines, lines)
+        suffix = common_suffix(old_lines, lines, min(len(old_lines), len(lines)) - prefix)
+        # Затронутые присваивания first..last-1 и их строки [region_start, region_end) в старом тексте
+        first = bisect_right(ends, prefix)
+        last = bisect_left(starts, len(old_lines) - suffix)
+        shift = len(lines) - len(old_lines)
+        while True:
+            region_start = min(prefix, starts[first]) if first < last else prefix
+            region_end = max(len(old_lines) - suffix, ends[last - 1] if first < last else 0)
+            # Присваивания, стоящие на тех же строках через ';', тоже входят в область
+            wider_first = bisect_left(starts, region_start)
+            wider_last = bisect_left(starts, region_end)
+            if wider_first < first or wider_last > last:
+                first, last = min(first, wider_first), max(last, wider_last)
+                continue
+            tokens = TOKEN_RE.findall("\n".join(lines[region_start:region_end + shift]))
+            region = split_statements(tokens, region_start)
+            if region is not None:
+                break
+            if last == len(records):  # Присваивание не закончено до конца текста
+                raise SyntaxError(f"Unexpected end of input on line {len(lines)}")
+            last += 1  # Изменение открыло скобку: в область входит следующее присваивание
+
+        translator = ConfigToToml()
+        parser = Parser(translator, ())
+        constants = translator.constants
+        constants.update(zip(map(CONSTANT_NAME, records[:first]), map(RESULT, records[:first])))
+        constants.pop(None, None)
+        before = {}  # Значения констант до области, переопределённых в ней
+        new_records = []
+        for start, _, name, operator, value, names in region:
+            record = self.evaluate(parser, name, operator, value, names, start)
+            new_records.append(record)
+            if operator == ":=":
+                before.setdefault(name, constants.get(name, MISSING))
+                constants[name] = record[4]
+        # Константы, значение которых после области изменилось
+        old_values = {name: result for _, name, _, _, result, _ in records[first:last] if name is not None}
+        changed = set()
+        for name in old_values.keys() | before.keys():
+            old = old_values[name] if name in old_values else before[name]
+            if old != constants.get(name, MISSING):
+                changed.add(name)
+
+        # Присваивания после области, зависящие от изменённых констант
+        updates = {}
+        position = last
+        while changed and position < len(records):
+            scope_name, name, value, names, result, _ = records[position]
+            if not changed.isdisjoint(names):
+                operator = "=" if name is None else ":="
+                record = self.evaluate(parser, scope_name or name, operator, value, names, starts[position] + shift)
+                updates[position] = record
+                if name is not None:
+                    if record[4] == result:
+                        changed.discard(name)
+                    else:
+                        changed.add(name)
+                    constants[name] = record[4]
+            elif name is not None:
+                changed.discard(name)  # Новое определение закрывает изменённую константу
+                constants[name] = result
+            position += 1
+
+        # Всё вычислено без ошибок: состояние обновляется
+        for position, record in updates.items():
+            records[position] = record
+        records[first:last] = new_records
+        starts[first:last] = [start for start, *_ in region]
+        ends[first:last] = [end for _, end, *_ in region]
+        if shift:
+            after = first + len(region)
+            starts[after:] = map(shift.__add__, starts[after:])
+            ends[after:] = map(shift.__add__, ends[after:])
+        self.lines = lines
+        self.reused = len(records) - self.evaluated
+        # Ключи в порядке первого появления с последним значением, как current_scope;
+        # все константы попадают под ключ None с пустыми строками TOML
+        scope = dict(zip(map(SCOPE_NAME, records), map(ENTRY, records)))
+        # Как в write_toml: простые ключи раньше таблиц, строки которых начинаются с заголовка
+        plain = [entry for entry in scope.values() if entry and entry[0][0] != "["]
+        tables = [entry for entry in scope.values() if entry and entry[0][0] == "["]
+        return "\n".join(chain(chain.from_iterable(plain), chain.from_iterable(tables)))
+
+def watch(input_path, output_path, translator, interval):
+    # Опрос времени изменения файла; после сохранения TOML перезаписывается атомарно
+    last_change = None
+    while True:
+        try:
+            change = os.stat(input_path).st_mtime_ns
+        except FileNotFoundError:
+            change = None
+        if change is not None and change != last_change:
+            last_change = change
+            start = time.perf_counter()
+            try:
+                with open(input_path, encoding="utf-8") as file:
+                    write_atomic(translator.translate(file.read()) + "\n", output_path)
+                print(f"{output_path}: {translator.evaluated} evaluated, {translator.reused} reused, "
+                      f"{(time.perf_counter() - start) * 1000:.1f} ms")
+            except (SyntaxError, ValueError) as e:
+                print(f"Error: {e}")
+        time.sleep(interval)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Translate a config file to TOML, re-evaluating only changed statements.")
+    parser.add_argument("input", help="Config file.")
+    parser.add_argument("-o", "--output", default="output.toml", help="TOML file to write (default: %(default)s).")
+    parser.add_argument("--cache", help="File keeping statement results between runs.")
+    parser.add_argument("--watch", action="store_true", help="Keep running and rewrite the output after every save.")
+    parser.add_argument("--interval", type=float, default=0.02, help="Polling interval for --watch, in seconds.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    translator = IncrementalTranslator.load(args.cache) if args.cache else IncrementalTranslator()
+    try:
+        if args.watch:
+            watch(args.input, args.output, translator, args.interval)
+        else:
+            with open(args.input, encoding="utf-8") as file:
+                write_atomic(translator.translate(file.read()) + "\n", args.output)
+            print(f"{args.output}: {translator.evaluated} evaluated, {translator.reused} reused")
+    except (SyntaxError, ValueError) as e:
+        print(f"Error: {e}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.cache:
+            translator.save(args.cache)
+
+if __name__ == "__main__":
+    main()
@@ -1,141 +1,485 @@
+import io
+import os
 import re
 import math
+import string
+import sys
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
+
+from tomlwriter import format_value, iter_dotted, iter_entry, write_toml
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Общий модуль instrument.py в confa
+from instrument import add_profile_arguments, metrics, profiling
+
+# Лексемы: числа, строки, имена, := и любой одиночный непробельный символ.
+# Пробелы перед лексемой поглощаются самим выражением, findall работает целиком на C.
+# Строка может содержать пары апострофов: 'it''s' - одна строка со значением it''s, как в прежнем разборе
+TOKEN_RE = re.compile(r"[ \t\r]*(\d+(?:\.\d+)?|'(?:[^'\n]|'')*'|[A-Za-z_]\w*|\|(?:[^|'\n]|'(?:[^'\n]|'')*')*\||:=|\n|\S)")
+# Комментарий начинается с (comment в начале строки (после пробелов), как в прежнем построчном разборе,
+# поэтому "(comment" внутри строки-значения его не открывает. Заканчивается он скобкой в конце строки:
+# скобки внутри строк комментария его не закрывают
+COMMENT_RE = re.compile(r"^[ \t]*\(comment[\s\S]*?\)[ \t\r]*(?=\n|$)", re.MULTILINE)
+COMMENT_START_RE = re.compile(r"^[ \t]*\(comment", re.MULTILINE)
+NOT_NEWLINE_RE = re.compile(r"[^\n]")
+DIGITS = frozenset(string.digits)
+NAME_START = frozenset(string.ascii_letters + "_")
+EOF = ""  # Лексема конца текста
+CHUNK_SIZE = 1 << 14  # Размер куска текста для findall: список лексем куска остаётся в кэше процессора
+
+# Операции постфиксных выражений: имя -> (число аргументов, функция).
+# Имя должно быть одной лексемой: словом или одиночным символом
+OPERATORS = {
+    "+": (2, lambda a, b: a + b),
+    "-": (2, lambda a, b: a - b),
+    "*": (2, lambda a, b: a * b),
+    "/": (2, lambda a, b: a / b),
+    "sqrt": (1, math.sqrt),
+    "ord": (1, lambda a: ord(str(a))),
+}
+POSTFIX_CACHE_SIZE = 4096  # Сколько скомпилированных выражений хранится по тексту
+
+def register_operator(name, arity):
+    """Декоратор, добавляющий операцию постфиксных выражений, например
+    @register_operator("max", 2)."""
+    def register(function):
+        OPERATORS[name] = (arity, function)
+        compile_postfix.cache_clear()  # Старые выражения связаны с прежней таблицей
+        return function
+    return register
+
+def apply_operator(name, function, arguments):
+    """Замыкание, вычисляющее операцию над аргументами; аргумент - ("value", значение)
+    для уже известного значения или ("code", функция от словаря констант)."""
+    def fail(error):
+        return ValueError(f"Cannot apply {name!r}: {error}")
+
+    if len(arguments) == 1:
+        (_, get), = arguments
+        def run(constants):
+            value = get(constants)
+            try:
+                return function(value)
+            except (ArithmeticError, TypeError, ValueError) as e:
+                raise fail(e) from None
+        return run
+    if len(arguments) == 2:
+        (left_kind, left), (right_kind, right) = arguments
+        if left_kind == "value":
+            def run(constants):
+                value = right(constants)
+                try:
+                    return function(left, value)
+                except (ArithmeticError, TypeError, ValueError) as e:
+                    raise fail(e) from None
+        elif right_kind == "value":
+            def run(constants):
+                value = left(constants)
+                try:
+                    return function(value, right)
+                except (ArithmeticError, TypeError, ValueError) as e:
+                    raise fail(e) from None
+        else:
+            def run(constants):
+                first, second = left(constants), right(constants)
+                try:
+                    return function(first, second)
+                except (ArithmeticError, TypeError, ValueError) as e:
+                    raise fail(e) from None
+        return run
+    getters = [get if kind == "code" else (lambda constants, value=get: value) for kind, get in arguments]
+    def run(constants):
+        values = [get(constants) for get in getters]
+        try:
+            return function(*values)
+        except (ArithmeticError, TypeError, ValueError) as e:
+            raise fail(e) from None
+    return run
+
+def interpret_postfix(source, constants):
+    """Однократное вычисление выражения |...| без компиляции: дешевле для выражений,
+    которые встречаются один раз."""
+    stack = []
+    for token in TOKEN_RE.findall(source[1:-1]):
+        first = token[:1]
+        if first in DIGITS:
+            stack.append(float(token) if "." in token else int(token))
+        elif first == "'":
+            stack.append(token[1:-1])
+        elif token in OPERATORS:
+            arity, function = OPERATORS[token]
+            if len(stack) < arity:
+                raise ValueError(f"Not enough operands for {token!r}")
+            arguments = stack[-arity:]
+            del stack[-arity:]
+            try:
+                stack.append(function(*arguments))
+            except (ArithmeticError, TypeError, ValueError) as e:
+                raise ValueError(f"Cannot apply {token!r}: {e}") from None
+        elif token in constants:
+            stack.append(constants[token])
+        elif token != "\n":
+            raise ValueError(f"Unknown token in expression: {token}")
+    if len(stack) != 1:
+        raise ValueError("Invalid postfix expression")
+    return stack[0]
+
+@lru_cache(maxsize=POSTFIX_CACHE_SIZE)
+def compile_postfix(source):
+    """Компиляция выражения |...| в функцию от словаря констант; результат кэшируется по тексту.
+    Операции над одними литералами вычисляются сразу (свёртка констант), операции выбираются
+    из OPERATORS при компиляции, поэтому при вычислении поиска по таблице нет."""
+    stack = []  # ("value", значение) или ("code", функция от словаря констант)
+    names = []
+    for token in TOKEN_RE.findall(source[1:-1]):
+        first = token[:1]
+        if first in DIGITS:
+            stack.append(("value", float(token) if "." in token else int(token)))
+        elif first == "'":
+            stack.append(("value", token[1:-1]))
+        elif token in OPERATORS:
+            arity, function = OPERATORS[token]
+            if len(stack) < arity:
+                raise ValueError(f"Not enough operands for {token!r}")
+            arguments = stack[-arity:]
+            del stack[-arity:]
+            if all(kind == "value" for kind, _ in arguments):
+                try:
+                    stack.append(("value", function(*(value for _, value in arguments))))
+                except (ArithmeticError, TypeError, ValueError) as e:
+                    raise ValueError(f"Cannot apply {token!r}: {e}") from None
+            else:
+                stack.append(("code", apply_operator(token, function, arguments)))
+        elif first in NAME_START:
+            names.append(token)
+            stack.append(("code", itemgetter(token)))
+        elif token != "\n":
+            raise ValueError(f"Unknown token in expression: {token}")
+    if len(stack) != 1:
+        raise ValueError("Invalid postfix expression")
+    kind, result = stack[0]
+    if kind == "value":
+        return lambda constants: result
+
+    def evaluate(constants):
+        try:
+            return result(constants)
+        except KeyError:
+            missing = [name for name in names if name not in constants]
+            if not missing:
+                raise
+            raise ValueError(f"Unknown token in expression: {missing[0]}") from None
+    return evaluate
+
+class Token(str):
+    """Лексема с позицией; используется только для точного сообщения об ошибке."""
+
+def blank(text):
+    # Комментарий заменяется пробелами с сохранением переводов строк,
+    # поэтому номера строк и столбцов остальных лексем не меняются
+    return NOT_NEWLINE_RE.sub(" ", text)
+
+def split_chunks(text, size=CHUNK_SIZE):
+    """Куски текста примерно по size символов, разрезанные по переводам строк."""
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start + size)
+        end = len(text) if end < 0 else end + 1
+        yield text[start:end]
+        start = end
+
+def strip_comments(chunks):
+    """Куски текста без комментариев; незакрытый комментарий переносится в следующий кусок."""
+    pending = ""
+    for chunk in chunks:
+        text = pending + chunk
+        blanked = COMMENT_RE.sub(lambda match: blank(match.group()), text)
+        match = COMMENT_START_RE.search(blanked)
+        if match:
+            pending = text[match.start():]
+            blanked = blanked[:match.start()]
+        else:
+            pending = ""
+        yield blanked
+    if pending:  # Комментарий не закрыт до конца текста
+        yield blank(pending)
+
+def tokenize(chunks):
+    """Лексемы-строки всего текста; поток собирается из findall по кускам без Python-цикла."""
+    return chain.from_iterable(map(TOKEN_RE.findall, strip_comments(chunks)))
+
+def tokenize_with_positions(chunks):
+    """Те же лексемы, но с номером строки и столбца (медленнее, для сообщений об ошибках)."""
+    line = 1
+    for text in strip_comments(chunks):
+        line_start = 0
+        for match in TOKEN_RE.finditer(text):
+            token = Token(match.group(1))
+            token.line = line
+            token.column = match.start(1) - line_start + 1
+            yield token
+            if token == "\n":
+                line += 1
+                line_start = match.end()
+
+class Parser:
+    """Рекурсивный спуск по лексемам; значения вычисляются сразу при разборе.
+    Методы разбора значений принимают первую лексему и возвращают (значение, следующая лексема)."""
+
+    def __init__(self, translator, tokens, assign=None):
+        self.translator = translator
+        self.constants = translator.constants
+        # Что делать с готовым присваиванием верхнего уровня: по умолчанию - сохранить в current_scope
+        self.assign = assign or translator.current_scope.__setitem__
+        self.next_token = chain(tokens, (EOF,)).__next__
+        self.line = 1
+
+    def error(self, message, token, error=SyntaxError):
+        if isinstance(token, Token):
+            return error(f"{message} on line {token.line}, column {token.column}")
+        return error(f"{message} on line {self.line}")
+
+    def parse_program(self):
+        next_token = self.next_token
+        assign = self.assign
+        constants = self.constants
+        token = next_token()
+        while token != EOF:
+            if token == "\n":
+                self.line += 1
+                token = next_token()
+                continue
+            if token == ";":
+                token = next_token()
+                continue
+            self.translator.line_num = self.line
+            if token[0] not in NAME_START:
+                raise self.error(f"Invalid syntax: unexpected {token!r}", token)
+            name = token
+            operator = next_token()
+            if operator != "=" and operator != ":=":
+                raise self.error(f"Invalid syntax: expected ':=' or '=' after {name!r}", operator)
+            # Простые значения разбираются на месте, без вызова parse_value
+            token = next_token()
+            first = token[:1]
+            if first in DIGITS:
+                value = float(token) if "." in token else int(token)
+                token = next_token()
+            elif first == "'":
+                value = token[1:-1]
+                token = next_token()
+            elif token in constants:
+                value = constants[token]
+                token = next_token()
+            else:
+                value, token = self.parse_value(token)
+            if operator == "=":
+                assign(name, value)
+            else:
+                constants[name] = value
+            if token != "\n" and token != ";" and token != EOF:
+                raise self.error(f"Invalid syntax: unexpected {token!r}", token)
+
+    def parse_value(self, token):
+        first = token[:1]
+        if first in DIGITS:
+            return float(token) if "." in token else int(token), self.next_token()
+        if first == "'":
+            return token[1:-1], self.next_token()
+        if first in NAME_START:
+            if token not in self.constants:
+                raise self.error(f"Unknown token in expression: {token}", token, ValueError)
+            return self.constants[token], self.next_token()
+        if first == "|":
+            return self.parse_postfix(token)
+        if token == "[":
+            return self.parse_array()
+        if token == "{":
+            return self.parse_dict()
+        raise self.error(f"Invalid syntax: expected a value, got {token or 'end of input'!r}", token)
+
+    def skip_separators(self, token):
+        while token == ";" or token == "\n":
+            if token == "\n":
+                self.line += 1
+            token = self.next_token()
+        return token
+
+    def parse_array(self):
+        # [ значение; значение; ... ], элементы могут стоять на разных строках
+        items = []
+        next_token = self.next_token
+        token = self.skip_separators(next_token())
+        while token != "]":
+            first = token[:1]
+            if first in DIGITS:
+                items.append(float(token) if "." in token else int(token))
+                token = next_token()
+            elif first == "'":
+                items.append(token[1:-1])
+                token = next_token()
+            else:
+                value, token = self.parse_value(token)
+                items.append(value)
+            if token != ";" and token != "\n" and token != "]":
+                raise self.error(f"Expected ';' or ']', got {token or 'end of input'!r}", token)
+            token = self.skip_separators(token)
+        return items, self.next_token()
+
+    def parse_dict(self):
+        # { имя = значение; ... }, записи могут стоять на разных строках
+        result = {}
+        next_token = self.next_token
+        token = self.skip_separators(next_token())
+        while token != "}":
+            if token[:1] not in NAME_START:
+                raise self.error(f"Expected a name, got {token or 'end of input'!r}", token)
+            name = token
+            operator = next_token()
+            if operator != "=":
+                raise self.error(f"Expected '=' after {name!r}", operator)
+            token = next_token()
+            first = token[:1]
+            if first in DIGITS:
+                result[name] = float(token) if "." in token else int(token)
+                token = next_token()
+            elif first == "'":
+                result[name] = token[1:-1]
+                token = next_token()
+            else:
+                result[name], token = self.parse_value(token)
+            if token != ";" and token != "\n" and token != "}":
+                raise self.error(f"Expected ';' or '}}', got {token or 'end of input'!r}", token)
+            token = self.skip_separators(token)
+        return result, self.next_token()
+
+    def parse_postfix(self, token):
+        # |операнды и операции|, например |CONST 2 *|. Однострочное выражение приходит
+        # одной лексемой; если оно разбито на строки, лексемы собираются до закрывающей '|'
+        if token == "|":
+            parts = []
+            part = self.next_token()
+            while part != "|":
+                if part == EOF:
+                    raise self.error("Unterminated postfix expression", token)
+                if part == "\n":
+                    self.line += 1
+                else:
+                    parts.append(part)
+                part = self.next_token()
+            source = f"|{' '.join(parts)}|"
+        else:
+            source = token
+        # Выражение компилируется, когда встречается повторно; в первый раз оно просто вычисляется
+        seen = self.translator.postfix_seen
+        try:
+            if source in seen:
+                value = compile_postfix(source)(self.constants)
+            else:
+                if len(seen) >= POSTFIX_CACHE_SIZE:
+                    seen.clear()
+                seen.add(source)
+                value = interpret_postfix(source, self.constants)
+        except ValueError as e:
+            raise self.error(str(e), token, ValueError) from None
+        return value, self.next_token()
 
 class ConfigToToml:
     def __init__(self):
         self.constants = {}  # Хранение констант
         self.current_scope = {}  # Хранение текущего состояния
         self.line_num = 0  # Номер строки для отслеживания ошибок
+        self.postfix_seen = set()  # Тексты уже встречавшихся постфиксных выражений
 
     def evaluate(self, expr):
-        """Вычисление значения (числа, строки, постфиксные выражения)."""
-        if re.match(r"^\d+(\.\d+)?$", expr):  # Число
-            return float(expr) if '.' in expr else int(expr)
-        elif re.match(r"^'.*'$", expr):  # Строка
-            return expr.strip("'")
-        elif expr in self.constants:  # Константа
-            return self.constants[expr]
-        elif expr.startswith("|") and expr.endswith("|"):  # Постфиксное выражение
-            return self.evaluate_postfix(expr[1:-1].strip())
-        else:
-            raise ValueError(f"Unknown token in expression: {expr}")
+        """Вычисление значения (числа, строки, константы, постфиксные выражения, массивы, словари)."""
+        parser = Parser(self, tokenize_with_positions([expr]))
+        value, token = parser.parse_value(parser.next_token())
+        if token != EOF:
+            raise parser.error(f"Unknown token in expression: {token}", token, ValueError)
+        return value
 
     def evaluate_postfix(self, expr):
         """Вычисление постфиксных выражений (например, |CONST 2 *|)."""
-        tokens = expr.split()
-        stack = []
-        for token in tokens:
-            if re.match(r"^\d+(\.\d+)?$", token):  # Число
-                stack.append(float(token) if '.' in token else int(token))
-            elif token in self.constants:  # Константа
-                stack.append(self.constants[token])
-            elif token in "+-*/":  # Операции
-                b = stack.pop()
-                a = stack.pop()
-                if token == "+":
-                    stack.append(a + b)
-                elif token == "-":
-                    stack.append(a - b)
-                elif token == "*":
-                    stack.append(a * b)
-                elif token == "/":
-                    stack.append(a / b)
-            elif token == "sqrt":  # Квадратный корень
-                a = stack.pop()
-                stack.append(math.sqrt(a))
-            elif token == "ord":  # Функция ord()
-                a = stack.pop()
-                stack.append(ord(str(a)))
-            else:
-                raise ValueError(f"Unknown token in expression: {token}")
-        if len(stack) != 1:
-            raise ValueError(f"Invalid postfix expression: {expr}")
-        return stack.pop()
-
-    def process_array(self, text):
-        """Парсинг массива."""
-        items = text[1:-1].split(";")  # Убираем квадратные скобки и разделяем элементы
-        return [self.evaluate(item.strip()) for item in items if item.strip()]
-
-    def process_dict(self, text):
-        """Парсинг словаря."""
-        text = text[1:-1].strip()  # Убираем фигурные скобки и пробелы
-        items = text.split(";")  # Разделяем элементы словаря по ;
-        result = {}
-        for item in items:
-            if "=" in item:
-                name, value = map(str.strip, item.split("=", 1))
-                result[name] = self.evaluate(value)
-        return result
-
-    def process_line(self, line):
-        """Обработка строки входного текста."""
-        self.line_num += 1
-        # Удаляем лишний символ ; в конце строки
-        if line.endswith(";"):
-            line = line[:-1].strip()
-
-        # Обработка констант
-        if ":=" in line:
-            name, value = map(str.strip, line.split(":=", 1))
-            self.constants[name] = self.evaluate(value)
-        # Присваивание значения
-        elif "=" in line:
-            name, value = map(str.strip, line.split("=", 1))
-            if value.startswith("[") and value.endswith("]"):  # Массив
-                self.current_scope[name] = self.process_array(value)
-            elif value.startswith("{") and value.endswith("}"):  # Словарь
-                self.current_scope[name] = self.process_dict(value)
-            else:
-                self.current_scope[name] = self.evaluate(value)
-        else:
-            raise SyntaxError(f"Invalid syntax on line {self.line_num}: {line}")
+        return self.evaluate(f"|{expr}|")
 
     def process(self, input_text):
-        """Основной процесс парсинга."""
-        inside_comment = False  # Флаг для отслеживания многострочных комментариев
-        for line in input_text.strip().split("\n"):
-            line = line.strip()
-            if not line:  # Пропускаем пустые строки
-                continue
-            if line.startswith("(comment"):  # Начало многострочного комментария
-                inside_comment = True
-                continue
-            if inside_comment:
-                if line.endswith(")"):  # Конец многострочного комментария
-                    inside_comment = False
-                continue
-            if inside_comment:  # Игнорируем строки внутри комментария
-                continue
-            self.process_line(line)
+        """Основной процесс парсинга: лексемы всего текста получаются за один проход."""
+        constants, scope = dict(self.constants), dict(self.current_scope)
+        try:
+            tokens = tokenize(split_chunks(input_text))
+            if metrics.enabled:
+                # Лексемы собираются в список заранее, чтобы время лексера и вычисления считалось отдельно
+                with metrics.phase("lex"):
+                    tokens = list(tokens)
+                metrics.count("tokens", len(tokens))
+            with metrics.phase("evaluate"):
+                Parser(self, tokens).parse_program()
+        except (SyntaxError, ValueError):
+            # Быстрые лексемы не знают своих столбцов: разбор повторяется с позициями,
+            # чтобы сообщение об ошибке указывало строку и столбец
+            self.constants, self.current_scope = constants, scope
+            Parser(self, tokenize_with_positions([input_text])).parse_program()
+            raise
+
+    def process_stream(self, lines, write):
+        """Потоковый перевод: TOML каждого присваивания верхнего уровня передаётся в write,
+        как только оно разобрано. Значения не накапливаются: в памяти остаются только константы и имена ключей."""
+        emitted = set()
+
+        def assign(key, value):
+            if key in emitted:  # Повторный ключ в уже выведенном TOML не исправить
+                raise ValueError(f"Duplicate key {key!r} on line {parser.line}")
+            emitted.add(key)
+            # Заголовок таблицы отнёс бы следующие ключи к ней, поэтому словари пишутся точечными ключами
+            for line in iter_dotted(key, value):
+                write(line)
+                write("\n")
+
+        parser = Parser(self, tokenize(lines), assign)
+        with metrics.phase("stream"):  # Чтение, вычисление и вывод идут вперемешку
+            parser.parse_program()
+
+    def write_toml(self, file):
+        """Запись результата в TOML в текстовый поток: сначала простые ключи, затем таблицы."""
+        with metrics.phase("emit"):
+            write_toml(self.current_scope, file)
+        metrics.count("keys", len(self.current_scope))
 
     def to_toml(self):
         """Преобразование результата в TOML."""
-        result = []
-        for key, value in self.current_scope.items():
-            if isinstance(value, dict):  # Словарь
-                result.append(f"[{key}]")
-                for sub_key, sub_value in value.items():
-                    result.append(f"{sub_key} = {self.format_value(sub_value)}")
-            else:
-                result.append(f"{key} = {self.format_value(value)}")
-        return "\n".join(result)
+        buffer = io.StringIO()
+        self.write_toml(buffer)
+        return buffer.getvalue()[:-1]
+
+    def format_entry(self, key, value):
+        """Строки TOML для одного ключа верхнего уровня."""
+        return list(iter_entry(key, value))
 
     def format_value(self, value):
         """Форматирование значения для TOML."""
-        if isinstance(value, str):
-            return f"'{value}'"
-        elif isinstance(value, list):
-            return f"[{', '.join(map(str, value))}]"
-        else:
-            return str(value)
+        return format_value(value)
 
 if __name__ == "__main__":
-    import sys
-    input_text = sys.stdin.read()
+    import argparse
+    arguments = argparse.ArgumentParser(description="Translate the config language from stdin to TOML on stdout.")
+    arguments.add_argument("--stream", action="store_true",
+                           help="Read stdin line by line and print TOML for each top-level assignment as soon as "
+                                "it is parsed, keeping memory bounded by the largest single value.")
+    add_profile_arguments(arguments)
+    args = arguments.parse_args()
     parser = ConfigToToml()
-    try:
-        parser.process(input_text)
-        print(parser.to_toml())
-    except Exception as e:
-        print(f"Error: {e}")
+    with profiling("translator", args.profile, args.profile_output):
+        try:
+            if args.stream:
+                parser.process_stream(sys.stdin, sys.stdout.write)
+            else:
+                parser.process(sys.stdin.read())
+                parser.write_toml(sys.stdout)
+        except Exception as e:
+            print(f"Error: {e}")
+        info = compile_postfix.cache_info()
+        metrics.count("constants", len(parser.constants))
+        metrics.count("postfix_compiled", info.misses)
+        metrics.count("postfix_cache_hits", info.hits)
@@ -1,7 +1,17 @@
 import unittest
 from io import StringIO
+import json
+import os
 import sys
-from main import ConfigToToml  # Импортируем ваш класс из файла config_to_toml.py
+import tempfile
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    tomllib = None
+from main import (ConfigToToml, OPERATORS, compile_postfix, profiling, register_operator, split_chunks,
+                  tokenize)  # Импортируем ваш класс из файла config_to_toml.py
+from batch import collect_files, load_prelude, run_batch, write_atomic
+from incremental import IncrementalTranslator
 
 class TestConfigToToml(unittest.TestCase):
     def setUp(self):
@@ -13,6 +23,12 @@ class TestConfigToToml(unittest.TestCase):
         self.parser.process(input_text)
         return self.parser.to_toml()
 
+    def translate_fresh(self, input_text):
+        """Перевод текста новым экземпляром ConfigToToml."""
+        parser = ConfigToToml()
+        parser.process(input_text)
+        return parser.to_toml()
+
     def test_constants(self):
         """Тест на объявление и использование констант."""
         input_text = """
@@ -79,6 +95,29 @@ class TestConfigToToml(unittest.TestCase):
         output = self.parse_and_get_output(input_text)
         self.assertEqual(output, expected_output)
 
+    def test_comment_with_parentheses(self):
+        """Тест на скобки внутри комментария: комментарий закрывает только скобка в конце строки."""
+        input_text = "(comment\nuse f(x) here\n)\na = 1\n"
+        self.assertEqual(self.parse_and_get_output(input_text), "a = 1")
+        chunks = list(split_chunks(input_text, 4))
+        self.assertEqual(list(tokenize(chunks)), list(tokenize([input_text])))
+
+    def test_comment_word_in_string(self):
+        """Тест на "(comment" внутри строки: комментарий открывается только в начале строки текста."""
+        input_text = "a = 'see (comment here'\nb = 'x (comment y)'\n"
+        expected = {"a": "see (comment here", "b": "x (comment y)"}
+        self.parser.process(input_text)
+        self.assertEqual(self.parser.current_scope, expected)
+        output = StringIO()
+        ConfigToToml().process_stream(StringIO(input_text), output.write)
+        self.assertEqual(output.getvalue(), "a = 'see (comment here'\nb = 'x (comment y)'\n")
+        self.assertEqual(IncrementalTranslator().translate(input_text), self.parse_and_get_output(input_text))
+
+    def test_doubled_quotes(self):
+        """Тест на пару апострофов в строке: строка принимается, апострофы остаются как есть."""
+        self.parser.process("a = 'it''s'\nb = ['x''y'; '']\n")
+        self.assertEqual(self.parser.current_scope, {"a": "it''s", "b": ["x''y", ""]})
+
     def test_combined_features(self):
         """Тест на комбинацию всех возможностей."""
         input_text = """
@@ -111,5 +150,235 @@ class TestConfigToToml(unittest.TestCase):
         with self.assertRaises(SyntaxError):
             self.parser.process(input_text)
 
+    def test_strings_with_separators(self):
+        """Тест на строки, содержащие '=', ';' и ':='."""
+        input_text = """
+        text = 'a = b; c := d'
+        """
+        expected_output = "text = 'a = b; c := d'"
+        output = self.parse_and_get_output(input_text)
+        self.assertEqual(output, expected_output)
+
+    def test_multiline_values(self):
+        """Тест на массивы и словари, записанные на нескольких строках."""
+        input_text = """
+        CONST := 7
+        numbers = [
+            1;
+            CONST
+        ]
+        data = {
+            size = |CONST 1 +|;
+            name = 'x';
+        }
+        """
+        expected_output = "numbers = [1, 7]\n[data]\nsize = 8\nname = 'x'"
+        output = self.parse_and_get_output(input_text)
+        self.assertEqual(output, expected_output)
+
+    def test_error_position(self):
+        """Тест на номер строки и столбца в сообщении об ошибке."""
+        input_text = "CONST := 42\nvalue = [1; 2 3]\n"
+        with self.assertRaises(SyntaxError) as context:
+            self.parser.process(input_text)
+        self.assertIn("line 2, column 15", str(context.exception))
+
+    def test_comment_across_chunks(self):
+        """Тест на комментарий, разрезанный между кусками текста."""
+        input_text = "a = 1\n(comment\n; = ]\nb = 2\n)\nlast = 'x y'\n"
+        chunks = list(split_chunks(input_text, 4))
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual("".join(chunks), input_text)
+        self.assertEqual(list(tokenize(chunks)), list(tokenize([input_text])))
+        self.assertNotIn("b", list(tokenize(chunks)))
+
+    @unittest.skipIf(tomllib is None, "tomllib requires Python 3.11")
+    def test_stream(self):
+        """Тест на потоковый перевод: те же данные, что и при разборе целого текста."""
+        input_text = """
+        CONST := 42
+        value = |CONST 2 *|
+        numbers = [1; 2;
+            CONST]
+        (comment
+        data = { key = 'skip' }
+        )
+        data = { key = 'value'; another = CONST }
+        """
+        output = StringIO()
+        ConfigToToml().process_stream(StringIO(input_text), output.write)
+        # Словари в потоке записываются точечными ключами, а не заголовками таблиц
+        self.assertIn("data.key = 'value'\n", output.getvalue())
+        self.assertEqual(tomllib.loads(output.getvalue()), tomllib.loads(self.parse_and_get_output(input_text)))
+
+    def test_stream_duplicate_key(self):
+        """Тест на повторный ключ в потоковом режиме."""
+        with self.assertRaises(ValueError):
+            ConfigToToml().process_stream(StringIO("a = 1\na = 2\n"), StringIO().write)
+
+    def test_repeated_postfix(self):
+        """Тест на повторное выражение: второй раз оно вычисляется скомпилированным."""
+        input_text = """
+        A := 9
+        first = |A sqrt 2 3 * +|
+        A := 16
+        second = |A sqrt 2 3 * +|
+        B := |A sqrt 2 3 * +|
+        third = |B
+            1 -|
+        """
+        expected_output = "first = 9.0\nsecond = 10.0\nthird = 9.0"
+        output = self.parse_and_get_output(input_text)
+        self.assertEqual(output, expected_output)
+
+    def test_compile_postfix(self):
+        """Тест на свёртку констант и ошибки скомпилированных выражений."""
+        self.assertEqual(compile_postfix("|2 3 * 'A' ord +|")({}), 71)
+        self.assertEqual(compile_postfix("|X 2 3 * +|")({"X": 1}), 7)
+        with self.assertRaises(ValueError):
+            compile_postfix("|X 1 +|")({})
+        with self.assertRaises(ValueError):
+            compile_postfix("|X 0 /|")({"X": 1})
+        with self.assertRaises(ValueError):
+            compile_postfix("|1 +|")
+
+    def test_register_operator(self):
+        """Тест на добавление операции в таблицу."""
+        register_operator("max", 2)(max)
+        try:
+            output = self.parse_and_get_output("A := 5\nvalue = |A 7 max|\nsame = |A 7 max|\n")
+        finally:
+            del OPERATORS["max"]
+            compile_postfix.cache_clear()
+        self.assertEqual(output, "value = 7\nsame = 7")
+
+    def test_batch(self):
+        """Тест на пакетный перевод: общий пролог, отдельные области видимости, ошибки по файлам."""
+        with tempfile.TemporaryDirectory() as directory:
+            def write(name, text):
+                path = os.path.join(directory, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w", encoding="utf-8") as file:
+                    file.write(text)
+                return path
+
+            prelude = write("prelude.txt", "BASE := 10\nignored = 1\n")
+            write("in/one.txt", "LOCAL := 2\na = |BASE LOCAL *|\n")
+            write("in/sub/two.txt", "b = LOCAL\n")  # Константа другого файла недоступна
+            write("in/three.txt", "c = [1;\n2 3]\n")
+            jobs = collect_files([os.path.join(directory, "in")], output_dir=os.path.join(directory, "out"))
+            self.assertEqual(len(jobs), 3)
+            results = run_batch(jobs, load_prelude(prelude), 1)
+            errors = {os.path.basename(input_path): error for input_path, _, _, error in results}
+            self.assertIsNone(errors["one.txt"])
+            self.assertIn("LOCAL", errors["two.txt"])
+            self.assertIn("line 2", errors["three.txt"])
+            with open(os.path.join(directory, "out", "one.toml"), encoding="utf-8") as file:
+                self.assertEqual(file.read(), "a = 20\n")
+            self.assertFalse(os.path.exists(os.path.join(directory, "out", "sub", "two.toml")))
+            self.assertEqual(sorted(os.listdir(os.path.join(directory, "out"))), ["one.toml"])
+
+    def test_write_atomic_mode(self):
+        """Тест на права файлов: новый файл получает права по umask, существующий сохраняет свои."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "out.toml")
+            umask = os.umask(0o022)
+            try:
+                write_atomic("a = 1\n", path)
+                self.assertEqual(os.stat(path).st_mode & 0o777, 0o644)
+                os.chmod(path, 0o640)
+                write_atomic("a = 2\n", path)
+                self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+            finally:
+                os.umask(umask)
+
+    def test_incremental(self):
+        """Тест на повторный перевод: заново вычисляются изменённые присваивания и зависящие от констант."""
+        text = """
+        A := 2
+        B := |A 3 *|
+        x = A; y = [B;
+            1]
+        (comment
+        z = 1
+        )
+        z = 'text'
+        A := 10
+        w = A
+        """
+        translator = IncrementalTranslator()
+        self.assertEqual(translator.translate(text), self.parse_and_get_output(text))
+        self.assertEqual(translator.evaluated, 7)
+
+        edited = text.replace("A := 2", "A := 4")
+        self.assertEqual(translator.translate(edited), self.translate_fresh(edited))
+        # A, B, x и y зависят от изменённой константы; w ссылается на новое определение A
+        self.assertEqual((translator.evaluated, translator.reused), (4, 3))
+
+        edited = edited.replace("z = 'text'", "z = 'other'\nv = B")
+        self.assertEqual(translator.translate(edited), self.translate_fresh(edited))
+        self.assertEqual(translator.evaluated, 2)
+
+        with self.assertRaises(SyntaxError):
+            translator.translate(edited.replace("v = B", "v = [B"))
+        self.assertEqual(translator.translate(edited), self.translate_fresh(edited))
+        self.assertEqual(translator.evaluated, 0)
+
+    def test_incremental_cache_file(self):
+        """Тест на сохранение состояния повторного перевода между запусками."""
+        with tempfile.TemporaryDirectory() as directory:
+            cache_path = os.path.join(directory, "cache.pickle")
+            translator = IncrementalTranslator.load(cache_path)
+            translator.translate("A := 1\nb = A\nc = 2\n")
+            translator.save(cache_path)
+            translator = IncrementalTranslator.load(cache_path)
+            self.assertEqual(translator.translate("A := 1\nb = A\nc = 3\n"), "b = 1\nc = 3")
+            self.assertEqual(translator.evaluated, 1)
+
+    @unittest.skipIf(tomllib is None, "tomllib requires Python 3.11")
+    def test_toml_round_trip(self):
+        """Тест на экранирование, вложенные таблицы и массивы таблиц: tomllib читает те же данные."""
+        self.parser.current_scope = {
+            "server": {"host": "it's \"here\"", "ports": [80, 443], "tls": {"cert": "C:\\certs\\a.pem"}},
+            "name": "line\nbreak\ttab\x01",
+            "ratio": 0.5,
+            "big": 1e20,
+            "limit": float("inf"),
+            "ключ": "значение",
+            "users": [{"name": "a", "roles": ["x", "y"]}, {"name": "b", "meta": {"age": 3}}],
+            "matrix": [[1, 2], ["a", {"k": 1}]],
+            "empty": {},
+            "nothing": [],
+        }
+        output = self.parser.to_toml()
+        self.assertEqual(tomllib.loads(output), self.parser.current_scope)
+        self.assertIn("[server.tls]", output)
+        self.assertIn("[[users]]", output)
+        self.assertIn("[users.meta]", output)
+        self.assertLess(output.index("ratio = 0.5"), output.index("[server]"))
+
+    def test_write_toml(self):
+        """Тест на запись в поток: тот же текст, что и to_toml, с переводом строки в конце."""
+        self.parser.process("A := 3\nx = [A; 'b']\nd = { k = { n = A } }\ny = 1\n")
+        buffer = StringIO()
+        self.parser.write_toml(buffer)
+        self.assertEqual(buffer.getvalue(), "x = [3, 'b']\ny = 1\n[d]\n[d.k]\nn = 3\n")
+        self.assertEqual(self.parser.to_toml() + "\n", buffer.getvalue())
+
+    def test_profile(self):
+        """Тест на --profile json: время лексера, вычисления и вывода и число лексем; результат тот же."""
+        text = "A := 3\nx = |A 1 +|\ny = [A; 'b']\n"
+        with tempfile.TemporaryDirectory() as workdir:
+            report_path = os.path.join(workdir, "profile.json")
+            with profiling("translator", "json", report_path):
+                self.parser.process(text)
+                output = self.parser.to_toml()
+            with open(report_path, encoding="utf-8") as file:
+                report = json.load(file)
+        self.assertEqual(output, self.translate_fresh(text))
+        self.assertEqual(set(report["phases"]), {"lex", "evaluate", "emit"})
+        self.assertEqual(report["counters"]["keys"], 2)
+        self.assertEqual(report["counters"]["tokens"], 16)
+
 if __name__ == "__main__":
     unittest.main()
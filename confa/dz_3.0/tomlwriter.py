@@ -0,0 +1,107 @@
+import math
+import re
+from itertools import islice
+
+BARE_KEY_RE = re.compile(r"[A-Za-z0-9_-]+")
+ESCAPES = {code: f"\\u{code:04x}" for code in (*range(0x20), 0x7f)}
+ESCAPES.update({ord("\b"): "\\b", ord("\t"): "\\t", ord("\n"): "\\n", ord("\f"): "\\f", ord("\r"): "\\r",
+                ord('"'): '\\"', ord("\\"): "\\\\"})
+
+def format_string(text):
+    # Литеральная строка '...' не может содержать апостроф и управляющие символы;
+    # isprintable() отсекает и часть допустимых символов, они уходят в строку с экранированием
+    if "'" not in text and text.isprintable():
+        return f"'{text}'"
+    return f'"{text.translate(ESCAPES)}"'
+
+def format_key(key):
+    if key.isascii() and (key.isalnum() or BARE_KEY_RE.fullmatch(key)):
+        return key
+    return f'"{key.translate(ESCAPES)}"'
+
+def format_float(value):
+    if value != value:
+        return "nan"
+    if value in (math.inf, -math.inf):
+        return "inf" if value > 0 else "-inf"
+    return repr(value)
+
+def format_list(value):
+    return f"[{', '.join(map(format_value, value))}]"
+
+def format_inline_table(value):
+    if not value:
+        return "{}"
+    return f"{{ {', '.join(f'{format_key(key)} = {format_value(item)}' for key, item in value.items())} }}"
+
+# Форматирование по точному типу значения: один поиск в словаре вместо цепочки isinstance
+FORMATTERS = {
+    str: format_string,
+    int: int.__repr__,
+    float: format_float,
+    bool: lambda value: "true" if value else "false",
+    list: format_list,
+    dict: format_inline_table,
+}
+
+def format_value(value):
+    """Значение в строчной записи TOML: словари - встроенные таблицы { ... }."""
+    formatter = FORMATTERS.get(type(value))
+    if formatter is None:
+        raise TypeError(f"Cannot convert {type(value).__name__} to TOML")
+    return formatter(value)
+
+def is_table_array(value):
+    # Первый элемент проверяется отдельно: у обычных массивов это сразу даёт ответ
+    return (isinstance(value, list) and value and isinstance(value[0], dict)
+            and all(isinstance(item, dict) for item in value))
+
+def iter_table(table, path):
+    """Строки тела таблицы: сначала простые ключи, затем вложенные таблицы [path.key]
+    и массивы таблиц [[path.key]]."""
+    nested = []
+    formatters = FORMATTERS
+    for key, value in table.items():
+        kind = type(value)
+        if kind is dict or kind is list and is_table_array(value):
+            nested.append((key, value))
+        else:
+            if not (key.isascii() and key.isalnum()):  # Обычные имена не требуют проверки
+                key = format_key(key)
+            yield f"{key} = {(formatters.get(kind) or format_value)(value)}"
+    for key, value in nested:
+        yield from iter_entry(key, value, path)
+
+def iter_entry(key, value, path=""):
+    """Строки TOML для одного ключа таблицы path."""
+    name = f"{path}.{format_key(key)}" if path else format_key(key)
+    if isinstance(value, dict):
+        yield f"[{name}]"
+        yield from iter_table(value, name)
+    elif is_table_array(value):
+        for item in value:
+            yield f"[[{name}]]"
+            yield from iter_table(item, name)
+    else:
+        yield f"{format_key(key)} = {format_value(value)}"
+
+def iter_dotted(key, value, path=""):
+    """Строки для ключа без заголовков таблиц: вложенные словари записываются точечными
+    ключами a.b = ..., поэтому строки можно выводить в любом порядке."""
+    name = f"{path}.{format_key(key)}" if path else format_key(key)
+    if isinstance(value, dict) and value:
+        for sub_key, item in value.items():
+            yield from iter_dotted(sub_key, item, name)
+    else:
+        yield f"{name} = {format_value(value)}"
+
+def write_toml(table, file, batch=1024):
+    """Запись документа в текстовый поток file: корневые простые ключи, затем таблицы.
+    Строки передаются в file.write пачками по batch, а не собираются в памяти целиком."""
+    lines = iter_table(table, "")
+    while True:
+        chunk = list(islice(lines, batch))
+        if not chunk:
+            return
+        chunk.append("")
+        file.write("\n".join(chunk))
@@ -0,0 +1,115 @@
+import cProfile
+import json
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+DEFAULT_CPROFILE_OUTPUT = "profile.prof"  # Файл статистики cProfile, если --profile-output не задан
+
+class Phase:
+    # Замер одной фазы: время между входом и выходом прибавляется к фазе name
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+
+class NullPhase:
+    # Замер при выключенных метриках: ничего не делает
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_PHASE = NullPhase()
+
+class Metrics:
+    # Время по фазам и счётчики одного запуска. Пока enabled ложно, phase() и count()
+    # сводятся к одной проверке, поэтому вызовы можно оставлять в рабочем коде.
+    # Фазы вызываются на уровне этапов и команд, а не отдельных лексем или строк
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()  # Команды оболочки ZIP выполняются и в фоновом потоке
+        self.reset()
+
+    def reset(self):
+        self.times = defaultdict(float)
+        self.calls = Counter()
+        self.counters = Counter()
+        self.start = time.perf_counter()
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        return Phase(self, name)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.times[name] += seconds
+            self.calls[name] += 1
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] += amount
+
+    def report(self, tool):
+        phases = {name: {"seconds": round(seconds, 6), "calls": self.calls[name]}
+                  for name, seconds in self.times.items()}
+        return {
+            "tool": tool,
+            "total_seconds": round(time.perf_counter() - self.start, 6),
+            "phases": phases,
+            "counters": dict(self.counters),
+        }
+
+metrics = Metrics()  # Общие метрики процесса
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", choices=("json", "cprofile"),
+                        help="Record per-phase timings and counters and write them as JSON, "
+                             "or run under cProfile and write its statistics.")
+    parser.add_argument("--profile-output",
+                        help=f"Where to write the profile (default: stderr for json, {DEFAULT_CPROFILE_OUTPUT} "
+                             "for cprofile).")
+
+@contextmanager
+def profiling(tool, mode, output=None):
+    # Включает метрики на время блока и записывает результат при выходе из него, в том числе по ошибке.
+    # json - отчёт report() в output или stderr (stdout занят выводом инструментов);
+    # cprofile - статистика для python -m pstats, собранная в текущем потоке
+    if not mode:
+        yield metrics
+        return
+    metrics.reset()
+    metrics.enabled = True
+    profiler = cProfile.Profile() if mode == "cprofile" else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        metrics.enabled = False
+        if profiler is not None:
+            profiler.dump_stats(output or DEFAULT_CPROFILE_OUTPUT)
+        else:
+            text = json.dumps(metrics.report(tool), ensure_ascii=False, indent=2)
+            if output:
+                with open(output, "w", encoding="utf-8") as file:
+                    file.write(text + "\n")
+            else:
+                print(text, file=sys.stderr)